@@ -2,6 +2,7 @@ import random as r
 import copy
 import asyncio.queues as q
 import datetime
+from collections import deque
 
 # Defines a coordinate of arbitrary dimensions
 class Coordinate:
@@ -134,6 +135,12 @@ class ProblemState:
                 c2 = self.new_random_coordinate()
             self.packages.append(Package(c1, c2))
 
+        # The fixed parts of the problem, shared by every copy of the state
+        self.spec = ProblemSpec(m, n, k, y, size, tuple(self.garage.coords),
+                                tuple(tuple(p.origin.coords) for p in self.packages),
+                                tuple(tuple(p.destination.coords) for p in self.packages))
+        self.h = None  # Heuristic, worked out the first time it is needed
+
     # Generates a new random coordinate in y dimensions
     def new_random_coordinate(self):
         c = []
@@ -141,23 +148,29 @@ class ProblemState:
             c.append(r.randrange(0, self.size + 1, 1))
         return Coordinate(c)
 
-    # Define Equality - All fields must be equal
+    # Define Equality - Same problem and same canonical key, so it agrees with the hash
+    # The order packages were picked up in does not matter
     def __eq__(self, other):
-        if self.m != other.m or self.n != other.n or self.k != other.k or self.y != other.y or self.size != other.size\
-                or self.garage != other.garage:
-            return False
-        for i in range(self.m):
-            if self.trucks[i] != other.trucks[i]:
-                return False
-        for i in range(self.n):
-            if self.packages[i] != other.packages[i]:
-                return False
-        return True
+        return self.spec is other.spec and self.key() == other.key()
 
     # Not Equal
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    # Hash -- From the canonical key, so equal states hash the same
+    def __hash__(self):
+        return hash(self.key())
+
+    # Canonical key of the state: truck locations, the package numbers on each truck in increasing order and the
+    # package locations. Trucks and packages are numbered by position, so the random ids are left out and the
+    # key is the same for every copy of the state, and matches CompactState.key().
+    def key(self):
+        index = {id(p): j for j, p in enumerate(self.packages)}
+        trucks = tuple(tuple(t.location.coords) for t in self.trucks)
+        cargo = tuple(tuple(sorted(index[id(p)] for p in t.packages)) for t in self.trucks)
+        locations = tuple(tuple(p.location.coords) for p in self.packages)
+        return trucks, cargo, locations
+
     # Less Than -- Must be defined for the Priority Queue to work
     # Based only on cost, could be improved
     def __lt__(self, other):
@@ -204,8 +217,9 @@ class ProblemState:
                 if cc < self.size:
                     # make a new state, copying the current one
                     new_state = copy.deepcopy(self)
-                    # increase cost by 1
+                    # increase cost by 1; the parent's heuristic no longer applies
                     new_state.cost += 1
+                    new_state.h = None
                     # move the truck in the new state
                     new_state.trucks[i].location.coords[c] += 1
                     # if the truck is carrying packages, move those too
@@ -218,6 +232,7 @@ class ProblemState:
                 if cc > 0:
                     new_state = copy.deepcopy(self)
                     new_state.cost += 1
+                    new_state.h = None
                     new_state.trucks[i].location.coords[c] -= 1
                     for p in new_state.trucks[i].packages:
                         p.location.coords[c] -= 1
@@ -229,9 +244,10 @@ class ProblemState:
                 new_state = copy.deepcopy(self)
                 # increase cost by 1
                 new_state.cost += 1
+                new_state.h = None
                 # drop off the package
                 p = new_state.trucks[i].packages[p_idx]
-                p.carried = False
+                p.is_carried = False
                 new_state.trucks[i].packages.remove(p)
                 # append new state to list of successor states
                 succ.append(new_state)
@@ -240,15 +256,17 @@ class ProblemState:
             # and pick it up
             if len(self.trucks[i].packages) < self.k:
                 for p_idx in range(len(self.packages)):
-                    # look for packages at the current location
-                    if self.packages[p_idx].location == self.trucks[i].location:
+                    # look for packages at the current location that are not already on a truck
+                    if self.packages[p_idx].location == self.trucks[i].location and \
+                            not self.packages[p_idx].is_carried:
                         # make a new state, copying the current one
                         new_state = copy.deepcopy(self)
                         # increase cost by 1
                         new_state.cost += 1
+                        new_state.h = None
                         # pick up the package
                         p = new_state.packages[p_idx]
-                        p.carried = True
+                        p.is_carried = True
                         new_state.trucks[i].packages.append(p)
                         # append new state to list of successor states
                         succ.append(new_state)
@@ -257,28 +275,250 @@ class ProblemState:
         return succ
 
     # Heuristic Function
+    # The admissible estimate of CompactState.heuristic(), from the tables of the shared spec
     def heuristic(self):
-        h = 0
+        if self.h is None:
+            self.h = self.spec.tables.estimate(*self.key())
+        return self.h
+
+    # Compact copy of this state for searching (see CompactState)
+    def compact(self):
+        trucks, cargo, locations = self.key()
+        return CompactState(self.spec, trucks, cargo, locations, self.cost)
+
+
+# Class ProblemSpec -- The parts of a problem that never change during a search
+# One is shared by every CompactState of the problem
+class ProblemSpec:
+    __slots__ = ('m', 'n', 'k', 'y', 'size', 'garage', 'origins', 'destinations', 'tables')
+
+    def __init__(self, m, n, k, y, size, garage, origins, destinations):
+        self.m = m                        # Number of Trucks
+        self.n = n                        # Number of Packages
+        self.k = k                        # Truck Capacity
+        self.y = y                        # Dimensions
+        self.size = size                  # Size of City
+        self.garage = garage              # Location of Garage, a tuple
+        self.origins = origins            # Package origins, a tuple of tuples
+        self.destinations = destinations  # Package destinations, a tuple of tuples
+        self.tables = HeuristicTables(garage, destinations)  # Distances for the heuristic
+
+    # Copies of a state share the spec
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+# Class HeuristicTables -- Admissible heuristic for one problem, with its distance tables
+# Every action costs 1, so the cost still to pay is at least
+#   - 2 for each package not yet picked up and not at its destination (a pick up and a drop off) and 1 for each
+#     package on a truck (a drop off); these actions are all different,
+#   - plus the distance of every truck from the garage, since each one has to get back,
+#   - plus, for the package that needs it most, the detour its delivery forces on top of that: some truck has to
+#     go from where it is to the package, on to its destination and home, at least
+#     dist(truck, package) + dist(package, destination) + dist(destination, garage) - dist(truck, garage).
+# Passing the package between trucks only makes the trip longer, so the sum never overestimates.
+# The distances from each location to the garage and, per package, to its destination and then the garage are
+# worked out once and looked up after that.
+class HeuristicTables:
+    def __init__(self, garage, destinations):
+        self.garage = garage
+        self.destinations = destinations
+        self.home = dict()                              # location -> distance to the garage
+        self.finish = [dict() for _ in destinations]   # per package: location -> distance to destination and garage
+
+    # Distance from a location to the garage
+    def to_garage(self, location):
+        d = self.home.get(location)
+        if d is None:
+            d = _dist(location, self.garage)
+            self.home[location] = d
+        return d
+
+    # Distance from a location to package j's destination and on to the garage
+    def to_finish(self, j, location):
+        d = self.finish[j].get(location)
+        if d is None:
+            d = _dist(location, self.destinations[j]) + self.to_garage(self.destinations[j])
+            self.finish[j][location] = d
+        return d
+
+    # Lower bound on the cost from a state to the goal
+    def estimate(self, trucks, cargo, locations):
+        returns = [self.to_garage(t) for t in trucks]
+        h = sum(returns)
+        carried = set()
+        for c in cargo:
+            carried.update(c)
+        detour = 0
+        for j in range(len(locations)):
+            loc = locations[j]
+            if j in carried:
+                h += 1
+            elif loc == self.destinations[j]:
+                continue
+            else:
+                h += 2
+            # the truck carrying the package, if any, is at loc, so it is never beaten by another one
+            fetch = min(_dist(trucks[i], loc) - returns[i] for i in range(len(trucks)))
+            if fetch + self.to_finish(j, loc) > detour:
+                detour = fetch + self.to_finish(j, loc)
+        return h + detour
+
+
+# Class CompactState -- Immutable ProblemState for searching
+# Locations are tuples of ints, trucks and packages are numbered by their position instead of a random id,
+# and a truck's cargo is a tuple of package numbers in increasing order. A successor builds only the tuples
+# that change and shares everything else with its parent, so nothing is deep copied. Search runs on it like
+# on ProblemState.
+#
+# The hash is the XOR of one term per truck location, package location and package on a truck, so a
+# successor updates it from its parent's with the few terms that change instead of hashing the whole state.
+class CompactState:
+    __slots__ = ('spec', 'trucks', 'cargo', 'locations', 'cost', 'hash', 'h')
+
+    def __init__(self, spec, trucks, cargo, locations, cost=0, hash_=None):
+        self.spec = spec            # The ProblemSpec
+        self.trucks = trucks        # Location of each Truck
+        self.cargo = cargo          # Package numbers carried by each Truck
+        self.locations = locations  # Location of each Package
+        self.cost = cost            # Cost so far in reaching this state
+        if hash_ is None:
+            hash_ = 0
+            for i in range(len(trucks)):
+                hash_ ^= _truck_term(i, trucks[i])
+                for j in cargo[i]:
+                    hash_ ^= _cargo_term(i, j)
+            for j in range(len(locations)):
+                hash_ ^= _package_term(j, locations[j])
+        self.hash = hash_           # Hash of the state, kept up to date incrementally
+        self.h = None               # Heuristic, worked out the first time it is needed
+
+    # Define Equality - Same problem, trucks, cargo and package locations
+    def __eq__(self, other):
+        return self.hash == other.hash and self.trucks == other.trucks and self.cargo == other.cargo and \
+            self.locations == other.locations and self.spec is other.spec
 
-        for t in self.trucks:
-            for p in self.packages:
-                # add distance from package location to destination
-                d1 = p.location.dist(p.destination)
-                h += d1
-                # if package is not at destination and not carried
-                if d1 > 0 and not p.is_carried:
-                    # add distance from truck to package
-                    h += t.location.dist(p.location)
-            # add distance from truck to garage
-            h += t.location.dist(self.garage)
+    # Not Equal
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
-        # return heuristic value
-        return h
+    # Hash -- Kept up to date by successors()
+    def __hash__(self):
+        return self.hash
+
+    # Canonical key of the state, the same as ProblemState.key()
+    def key(self):
+        return self.trucks, self.cargo, self.locations
+
+    # Less Than -- Based only on cost, as for ProblemState
+    def __lt__(self, other):
+        return self.cost < other.cost
+
+    # Like toString()
+    def __str__(self):
+        spec = self.spec
+        s = "m=" + str(spec.m) + ", n=" + str(spec.n) + ", k=" + str(spec.k) + ", y=" + str(spec.y) + ", size="
+        s += str(spec.size) + ", cost=" + str(self.cost) + ", h(x)=" + str(self.heuristic())
+        s += "\nTruck(s):"
+        for i in range(spec.m):
+            s += "\n\tTruck " + str(i) + ": (Location: " + str(list(self.trucks[i])) + ", Packages: " + \
+                 str(len(self.cargo[i])) + ")"
+        s += "\nPackage(s):"
+        carried = self.carried()
+        for j in range(spec.n):
+            s += "\n\tPackage: (Origin: " + str(list(spec.origins[j])) + ", Destination: " + \
+                 str(list(spec.destinations[j])) + ", Carried: " + str(j in carried) + ", Location: " + \
+                 str(list(self.locations[j])) + ")"
+        return s
+
+    # Numbers of all packages on a truck
+    def carried(self):
+        carried = set()
+        for c in self.cargo:
+            carried.update(c)
+        return carried
+
+    # The Successor Function
+    # Same moves as ProblemState.successors()
+    def successors(self):
+        succ = list()
+        spec = self.spec
+        cost = self.cost + 1
+        trucks = self.trucks
+        cargo = self.cargo
+        for i in range(spec.m):
+            loc = trucks[i]
+            for c in range(spec.y):
+                # move up, then down, along coordinate c
+                for step in (1, -1):
+                    cc = loc[c] + step
+                    if cc < 0 or cc > spec.size:
+                        continue
+                    new_loc = loc[:c] + (cc,) + loc[c + 1:]
+                    new_trucks = trucks[:i] + (new_loc,) + trucks[i + 1:]
+                    new_hash = self.hash ^ _truck_term(i, loc) ^ _truck_term(i, new_loc)
+                    # packages on the truck move with it
+                    locations = self.locations
+                    if len(cargo[i]) > 0:
+                        locations = list(locations)
+                        for j in cargo[i]:
+                            locations[j] = new_loc
+                            new_hash ^= _package_term(j, loc) ^ _package_term(j, new_loc)
+                        locations = tuple(locations)
+                    succ.append(CompactState(spec, new_trucks, cargo, locations, cost, new_hash))
+
+            # drop off a package (one at a time); it stays where the truck is
+            for p_idx in range(len(cargo[i])):
+                new_cargo = cargo[:i] + (cargo[i][:p_idx] + cargo[i][p_idx + 1:],) + cargo[i + 1:]
+                new_hash = self.hash ^ _cargo_term(i, cargo[i][p_idx])
+                succ.append(CompactState(spec, trucks, new_cargo, self.locations, cost, new_hash))
+
+            # pick up a package at the truck's location if there is room
+            if len(cargo[i]) < spec.k:
+                carried = self.carried()
+                for j in range(spec.n):
+                    if self.locations[j] == loc and j not in carried:
+                        new_cargo = cargo[:i] + (tuple(sorted(cargo[i] + (j,))),) + cargo[i + 1:]
+                        new_hash = self.hash ^ _cargo_term(i, j)
+                        succ.append(CompactState(spec, trucks, new_cargo, self.locations, cost, new_hash))
+
+        return succ
+
+    # Heuristic Function -- Admissible, see HeuristicTables
+    def heuristic(self):
+        if self.h is None:
+            self.h = self.spec.tables.estimate(self.trucks, self.cargo, self.locations)
+        return self.h
+
+
+# Terms of the CompactState hash
+def _truck_term(i, location):
+    return hash((0, i, location))
+
+
+def _package_term(j, location):
+    return hash((1, j, location))
+
+
+def _cargo_term(i, j):
+    return hash((2, i, j))
+
+
+# Manhattan Distance between two location tuples
+def _dist(a, b):
+    d = 0
+    for i in range(len(a)):
+        d += abs(a[i] - b[i])
+    return d
 
 
 class Problem:
     # Initialize
-    def __init__(self, m=1, n=2, k=1, y=2, size=1):
+    # With compact=True the states are CompactStates, which search much faster
+    def __init__(self, m=1, n=2, k=1, y=2, size=1, compact=False):
         # Create Initial State based on parameters
         self.initial_state = ProblemState(m, n, k, y, size, Coordinate.origin(y))
         # Current State is a copy of Initial state at the beginning
@@ -287,6 +527,10 @@ class Problem:
         self.goal_state = copy.deepcopy(self.initial_state)
         for p in self.goal_state.packages:
             p.location = p.destination.copy()
+        if compact:
+            self.initial_state = self.initial_state.compact()
+            self.current_state = self.initial_state
+            self.goal_state = self.goal_state.compact()
 
     # isGoal
     # Check to see if a state matches the goal state
@@ -363,45 +607,159 @@ class StatePriorityQueue:
         return self.queue.empty()
 
 
+# Frontiers -- Plain containers with the same add/remove/empty interface as the queues above, without the
+# asyncio machinery and without comparing states
+
+# First in, first out, for BFS
+class DequeFrontier:
+    # initialize the frontier
+    def __init__(self):
+        self.states = deque()
+
+    # add a state to the frontier
+    def add(self, state):
+        self.states.append(state)
+
+    # Remove the oldest state
+    def remove(self):
+        return self.states.popleft()
+
+    # Check if frontier is empty
+    def empty(self):
+        return len(self.states) == 0
+
+
+# Last in, first out, for DFS
+class ListFrontier:
+    # initialize the frontier
+    def __init__(self):
+        self.states = []
+
+    # add a state to the frontier
+    def add(self, state):
+        self.states.append(state)
+
+    # Remove the newest state
+    def remove(self):
+        return self.states.pop()
+
+    # Check if frontier is empty
+    def empty(self):
+        return len(self.states) == 0
+
+
+# Bucket (Dial) queue for A*
+# Step costs are 1 and the heuristic is an integer, so f = cost + heuristic is a small integer and states can be
+# kept in one list per value of f instead of a heap. Within an f bucket there is one list per heuristic value and
+# the lowest heuristic comes out first, i.e. the state closest to the goal; equal states come out newest first.
+# A state reached again more cheaply is simply added again: search_astar skips the stale entry when it is removed
+# (lazy deletion), so nothing is ever searched for inside the queue.
+class BucketFrontier:
+    # initialize the queue
+    def __init__(self):
+        self.buckets = []  # buckets[f][h] is the list of states with that f and heuristic
+        self.lowest = 0    # No state in the queue has a lower f
+        self.count = 0     # Number of states in the queue
+
+    # add a state to the queue
+    # priority is cost + heuristic function
+    def add(self, state):
+        h = state.heuristic()
+        f = state.cost + h
+        while len(self.buckets) <= f:
+            self.buckets.append([])
+        bucket = self.buckets[f]
+        while len(bucket) <= h:
+            bucket.append([])
+        bucket[h].append(state)
+        # the heuristic need not be consistent, so f can go down
+        if f < self.lowest:
+            self.lowest = f
+        self.count += 1
+
+    # Remove a state with the lowest f
+    def remove(self):
+        if self.count <= 0:
+            raise Exception("Frontier is empty")
+        while True:
+            for states in self.buckets[self.lowest]:
+                if len(states) > 0:
+                    self.count -= 1
+                    return states.pop()
+            self.lowest += 1
+
+    # Check if queue is empty
+    def empty(self):
+        return self.count == 0
+
+
+# Counts of the work done by a search
+class SearchStats:
+    def __init__(self):
+        self.expanded = 0    # States whose successors were generated
+        self.generated = 0   # Successor states generated
+        self.duplicates = 0  # States skipped because they had already been reached at no higher cost
+
+    # Add the counts of another search
+    def merge(self, other):
+        self.expanded += other.expanded
+        self.generated += other.generated
+        self.duplicates += other.duplicates
+
+    # Like toString()
+    def __str__(self):
+        return "Expanded: " + str(self.expanded) + ", Generated: " + str(self.generated) + \
+               ", Duplicates Skipped: " + str(self.duplicates)
+
+
 # Search Class
 class Search:
     # Call the specified search method
+    # Pass a SearchStats to have the search count its work into it
     @staticmethod
-    def search(problem, initial_state, mode = "bfs"):
+    def search(problem, initial_state, mode = "bfs", stats=None):
         # Breadth-first Search
         if mode == "bfs":
-            ds = StateQueue()
-            return Search.search_basic(problem, initial_state, ds)
+            ds = DequeFrontier()
+            return Search.search_basic(problem, initial_state, ds, stats=stats)
         # Depth-first Search
         elif mode == "dfs":
-            ds = StateStack()
-            return Search.search_basic(problem, initial_state, ds, 100000)
+            ds = ListFrontier()
+            return Search.search_basic(problem, initial_state, ds, 100000, stats)
         # Iterative Deepening Search
         elif mode == "ids":
-            ds = StateStack()
-            return Search.search_ids(problem, initial_state, ds, 100)
+            return Search.search_ids(problem, initial_state, maxdepth=100, stats=stats)
         # A* Search
         elif mode == "astar":
-            ds = StatePriorityQueue()
-            return Search.search_astar(problem, initial_state, ds)
+            ds = BucketFrontier()
+            return Search.search_astar(problem, initial_state, ds, stats)
+        # Iterative Deepening A* Search
+        elif mode == "idastar":
+            return Search.search_idastar(problem, initial_state, 100, stats)
         else:
             raise Exception("Unknown Search Mode")
 
     # For DFS, BFS, depending on the type of data structure
-    # As per pseudocode provided
+    # As per pseudocode provided, with duplicate detection
     @staticmethod
-    def search_basic(problem, initial_state, queue, timeout=0):
+    def search_basic(problem, initial_state, queue, timeout=0, stats=None):
+        if stats is None:
+            stats = SearchStats()
+        # Lowest cost each state has been reached at (see Search.add_successors)
+        best_g = {initial_state: initial_state.cost}
         queue.add(initial_state)
         steps = 0
         while not queue.empty():
             here = queue.remove()
             # print(here)
+            if here.cost > best_g[here]:
+                # Reached more cheaply since it was added; that copy is searched instead
+                stats.duplicates += 1
+                continue
             if problem.is_goal(here):
                 return here
             else:
-                next_states = problem.successors(here)
-                for s in next_states:
-                    queue.add(s)
+                Search.add_successors(problem, here, queue, best_g, stats)
             steps += 1
             if timeout > 0 and steps > timeout:
                 return "Search timed out after " + str(timeout) + " steps."
@@ -409,53 +767,107 @@ class Search:
         return "Unsuccessful Search"
 
     # IDS  -- Iterative Deepening Search
-    # Based on provided pseudocode with modifications for depth limit
+    # Depth-first searches to depth 0, 1, 2, ... maxdepth; memory grows only with the depth, not the frontier
+    # queue is no longer used and only kept so that existing calls still work
+    @staticmethod
+    def search_ids(problem, initial_state, queue=None, maxdepth=100, stats=None):
+        return Search.search_iterative(problem, initial_state, maxdepth, stats, False)
+
+    # IDA*  -- Iterative Deepening A* Search
+    # Like IDS but each pass is bounded by cost + heuristic, and the next bound is the lowest one cut off
+    @staticmethod
+    def search_idastar(problem, initial_state, maxdepth=100, stats=None):
+        return Search.search_iterative(problem, initial_state, maxdepth, stats, True)
+
+    # Repeated bounded depth-first searches for IDS and IDA*
+    # Stops when a pass cuts nothing off (the whole space has been searched) or the bound passes maxdepth
     @staticmethod
-    def search_ids(problem, initial_state, queue, maxdepth=100):
-        for thisdepth in range(1,maxdepth):
-            queue.add((initial_state, 0))
-            while not queue.empty():
-                here, curdepth = queue.remove()
-                curdepth += 1
-                # print(here)
-                if problem.is_goal(here):
-                    return here
-                # Only Continue if Depth Limit has not been reached
-                elif curdepth < thisdepth:
-                    next_states = problem.successors(here)
-                    for s in next_states:
-                        queue.add((s, curdepth))
+    def search_iterative(problem, initial_state, maxdepth, stats, use_heuristic):
+        if stats is None:
+            stats = SearchStats()
+        bound = initial_state.cost + (initial_state.heuristic() if use_heuristic else 0)
+        while bound <= initial_state.cost + maxdepth:
+            found, bound = Search.search_bounded(problem, initial_state, bound, {initial_state}, stats,
+                                                 use_heuristic)
+            if found is not None:
+                return found
 
         return "Unsuccessful Search"
 
+    # Recursive depth-first search below here, cutting off states whose cost (plus heuristic) is above bound
+    # path holds the states from the start down to here; a successor already on it would be a cycle and is skipped
+    # Returns the goal state or None, and the lowest cost (plus heuristic) that was cut off, or infinity
+    @staticmethod
+    def search_bounded(problem, here, bound, path, stats, use_heuristic):
+        f = here.cost + (here.heuristic() if use_heuristic else 0)
+        if f > bound:
+            return None, f
+        if problem.is_goal(here):
+            return here, f
+        stats.expanded += 1
+        next_bound = float("inf")
+        for s in problem.successors(here):
+            stats.generated += 1
+            if s in path:
+                stats.duplicates += 1
+                continue
+            path.add(s)
+            found, b = Search.search_bounded(problem, s, bound, path, stats, use_heuristic)
+            path.remove(s)
+            if found is not None:
+                return found, b
+            if b < next_bound:
+                next_bound = b
+        return None, next_bound
+
     # A* Search
     # Similar to basic search but with Priority Queue
+    # A state is expanded again only if it is reached at a lower cost; the old queue entry is skipped when popped
     @staticmethod
-    def search_astar(problem, initial_state, queue):
+    def search_astar(problem, initial_state, queue, stats=None):
+        if stats is None:
+            stats = SearchStats()
+        best_g = {initial_state: initial_state.cost}
         queue.add(initial_state)
         while not queue.empty():
             here = queue.remove()
             # print(here)
+            if here.cost > best_g[here]:
+                stats.duplicates += 1
+                continue
             if problem.is_goal(here):
                 return here
             else:
-                next_states = problem.successors(here)
-                for s in next_states:
-                    queue.add(s)
+                Search.add_successors(problem, here, queue, best_g, stats)
 
         return "Unsuccessful Search"
 
+    # Expand a state: add each successor to the queue unless it has been reached before at no higher cost
+    # best_g maps every state reached so far to the lowest cost it has been reached at
+    @staticmethod
+    def add_successors(problem, here, queue, best_g, stats):
+        stats.expanded += 1
+        for s in problem.successors(here):
+            stats.generated += 1
+            g = best_g.get(s)
+            if g is not None and g <= s.cost:
+                stats.duplicates += 1
+            else:
+                best_g[s] = s.cost
+                queue.add(s)
+
 def main():
     # Set number of runs
     num_runs = 1000
     # Log the start time
     start_time = datetime.datetime.utcnow()
     # Set Up the Problem
-    problem = Problem(m=1, n=2, k=1, y=2, size=1)
+    problem = Problem(m=1, n=2, k=1, y=2, size=1, compact=True)
 
     # Run num_runs times to get a sense of performance
+    stats = SearchStats()
     for i in range(num_runs):
-        Search.search(problem, problem.initial_state, "astar")
+        Search.search(problem, problem.initial_state, "astar", stats)
 
     # Log end time
     end_time = datetime.datetime.utcnow()
@@ -463,7 +875,8 @@ def main():
     # Output results
     print("\n*****\nTOTAL TIME: " + str((end_time - start_time).total_seconds()) +
           "\nAVG. TIME: " + str((end_time - start_time).total_seconds() / num_runs) +
-          "\nNumber of Runs: " + str(num_runs))
+          "\nNumber of Runs: " + str(num_runs) +
+          "\n" + str(stats))
 
 
 if __name__ == "__main__":
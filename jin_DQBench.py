@@ -0,0 +1,261 @@
+import jin_DragonQueen as DragonQueen
+import jin_DQMCTS as DQMCTS
+import jin_DQTablebase as DQTablebase
+import datetime as dt
+import json
+import os
+import platform
+import tempfile
+import time
+from sys import argv
+
+
+# Move generator correctness (perft) and engine speed benchmarks for DragonQueen.
+#
+# perft counts the leaves of the full game tree to a fixed depth. The counts below were produced by the original
+# move() rules; every move generator -- move() itself, DragonQueen.successors() and DragonQueenBB.legal_moves()
+# -- must reproduce them exactly, so a faster generator that drops or invents moves shows up at once. The speed
+# benchmarks report nodes per second on the same positions, and the regression checks run the searches on
+# positions with known results. Results are printed, and optionally written, as JSON so runs can be compared
+# between releases.
+
+# Positions as rows 1 to 5 separated by '/', the side to move and the ply number
+POSITIONS = {
+    'start': ('..Q../.DDD./...../...../WWWWW', 'W', 1),
+    'opening': ('...Q./DD.../..W../...../W.WWW', 'W', 9),
+    'middlegame': ('D...Q/.D.../...../....W/.WW..', 'W', 21),
+    'endgame': ('..Q../.D.D./...../.W.W./..W..', 'D', 30),
+}
+
+# Positions covered by a queen + 1 dragon against 2 wights tablebase, for the regression checks
+TABLEBASE_POSITIONS = {
+    'dragons win': ('..Q../...../..D../...../W....', 'W', 30),
+}
+
+# Positions a depth-7 search at ply 10 finds a forced win in, which a depth-4 search at ply 45 cannot reach
+# before the 50-ply draw; a transposition table shared between the two must not hand the win on
+DRAW_HORIZON_POSITIONS = {
+    'dragons win a': ('...../QD.../W.D../...../..WW.', 'D'),
+    'dragons win b': ('...../...Q./..W../D..../...W.', 'D'),
+}
+
+# Leaf counts at depth 1, 2, 3, ... for each position
+EXPECTED_PERFT = {
+    'start': [5, 95, 881, 17223, 161152],
+    'opening': [11, 170, 1809, 26460, 295758],
+    'middlegame': [7, 84, 698, 8972, 73349],
+    'endgame': [17, 191, 3108, 27741, 444734],
+}
+
+
+def parse_position(text, player, countplies, cls=DragonQueen.DragonQueen):
+    """
+    Builds a position from the row notation used in POSITIONS
+    :param text: rows 1 to 5 separated by '/', each five of 'Q', 'D', 'W' or '.'
+    :param player: 'D' or 'W', the side to move
+    :param countplies: ply number of the position
+    :param cls: DragonQueen or DragonQueenBB
+    :return: cls object
+    """
+    rows = text.split('/')
+    if len(rows) != 5 or any(len(row) != 5 for row in rows):
+        raise Exception("Bad position: " + text)
+    state = dict()
+    for r, row in enumerate(rows, 1):
+        for c, piece in enumerate(row, 1):
+            state[r, c] = piece
+    return cls(state, player, countplies)
+
+
+def perft(node, depth):
+    """
+    Counts the positions depth plies below node, generating moves with legal_moves() and make_move()/
+    unmake_move() if the node has them and with successors() otherwise
+    :param node: DragonQueen or DragonQueenBB
+    :param depth: number of plies
+    :return: number of leaf positions; games that end earlier add nothing
+    """
+    if depth <= 0:
+        return 1
+    if hasattr(node, 'make_move'):
+        total = 0
+        for m in node.legal_moves():
+            node.make_move(m)
+            total += perft(node, depth - 1)
+            node.unmake_move()
+        return total
+    return sum(perft(child, depth - 1) for child in node.successors())
+
+
+def perft_move(node, depth):
+    """
+    perft using only move(), trying every piece of the side to move against each of its neighbour squares
+    :param node: DragonQueen
+    :param depth: number of plies
+    :return: number of leaf positions
+    """
+    if depth <= 0:
+        return 1
+    if node.isTerminal():
+        return 0
+    total = 0
+    for p in node.all_pieces(node.whoseTurn):
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                newstate = node.move(p, (p[0] + dr, p[1] + dc))
+                if newstate is not None:
+                    child = DragonQueen.DragonQueen(newstate, node.togglePlayer(node.whoseTurn),
+                                                    node.countPlies + 1)
+                    total += perft_move(child, depth - 1)
+    return total
+
+
+def _timed(f):
+    """
+    :param f: function with no arguments
+    :return: result of f, seconds it took
+    """
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def _json_value(value):
+    # JSON has no infinity, so forced wins are written as strings
+    return value if abs(value) != float('inf') else str(value)
+
+
+def run_perft(max_depth):
+    """
+    Checks all three move generators against EXPECTED_PERFT
+    :param max_depth: deepest perft to run
+    :return: list of result dicts, boolean all counts matched
+    """
+    results = list()
+    ok = True
+    generators = [
+        ('DragonQueenBB.legal_moves', lambda name, d: perft(parse_position(*POSITIONS[name],
+                                                                           cls=DragonQueen.DragonQueenBB), d)),
+        ('DragonQueen.successors', lambda name, d: perft(parse_position(*POSITIONS[name]), d)),
+        ('DragonQueen.move', lambda name, d: perft_move(parse_position(*POSITIONS[name]), d)),
+    ]
+    for name in POSITIONS:
+        expected = EXPECTED_PERFT.get(name, [])
+        for depth in range(1, max_depth + 1):
+            for generator, f in generators:
+                count, seconds = _timed(lambda: f(name, depth))
+                passed = depth > len(expected) or count == expected[depth - 1]
+                ok = ok and passed
+                results.append({'position': name, 'depth': depth, 'generator': generator, 'leaves': count,
+                                'expected': expected[depth - 1] if depth <= len(expected) else None,
+                                'passed': passed, 'seconds': seconds,
+                                'leaves_per_second': count / seconds if seconds > 0 else None})
+    return results, ok
+
+
+def run_checks():
+    """
+    Regression checks of the searches against a small tablebase built on the spot
+    :return: list of result dicts, boolean all checks passed
+    """
+    results = list()
+    ok = True
+    fd, file_name = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    try:
+        DQTablebase.write(file_name, DQTablebase.solve(1, 2, 2, verbose=False), 1, 2, 2)
+        tablebase = DragonQueen.Tablebase(file_name)
+    finally:
+        os.remove(file_name)
+    for name in TABLEBASE_POSITIONS:
+        node = parse_position(*TABLEBASE_POSITIONS[name], cls=DragonQueen.DragonQueenBB)
+        # MCTS must still pick a move, and keep the result, when the root itself is in the tablebase
+        value = tablebase.probe(node)
+        _, next_move = DQMCTS.mcts(node, nodes=100, seed=1, tablebase=tablebase)
+        passed = next_move is not None and (next_move.isTerminal() or tablebase.probe(next_move) == value)
+        ok = ok and passed
+        results.append({'check': 'mcts tablebase root', 'position': name, 'value': _json_value(value),
+                        'passed': passed})
+    for name in DRAW_HORIZON_POSITIONS:
+        text, player = DRAW_HORIZON_POSITIONS[name]
+        tt = DragonQueen.TranspositionTable()
+        DragonQueen.minimax_ab(parse_position(text, player, 10, cls=DragonQueen.DragonQueenBB), maxdepth=7, tt=tt)
+        node = parse_position(text, player, 45, cls=DragonQueen.DragonQueenBB)
+        value, _ = DragonQueen.minimax_ab(node, maxdepth=4, tt=tt)
+        expected, _ = DragonQueen.minimax_ab(node, maxdepth=4)
+        passed = value == expected
+        ok = ok and passed
+        results.append({'check': 'tt near draw', 'position': name, 'value': _json_value(value),
+                        'expected': _json_value(expected), 'passed': passed})
+    return results, ok
+
+
+def run_speed(search_depths):
+    """
+    Measures nodes per second of move generation, the heuristic and minimax_ab
+    :param search_depths: depths to run minimax_ab at
+    :return: list of result dicts
+    """
+    results = list()
+    for name in POSITIONS:
+        for cls in (DragonQueen.DragonQueen, DragonQueen.DragonQueenBB):
+            node = parse_position(*POSITIONS[name], cls=cls)
+            # Children of the position, expanded repeatedly
+            count, seconds = _timed(lambda: sum(len(node.successors()) for _ in range(2000)))
+            results.append({'benchmark': 'successors', 'position': name, 'class': cls.__name__, 'nodes': count,
+                            'seconds': seconds, 'nodes_per_second': count / seconds})
+
+            children = node.successors()
+            children = children * (20000 // len(children))
+            _, seconds = _timed(lambda: [c.heuristic() for c in children])
+            results.append({'benchmark': 'heuristic', 'position': name, 'class': cls.__name__,
+                            'nodes': len(children), 'seconds': seconds,
+                            'nodes_per_second': len(children) / seconds if seconds > 0 else None})
+
+            for depth in search_depths:
+                for engine in ('ab', 'pvs'):
+                    stats = DragonQueen.SearchStats()
+                    (value, _), seconds = _timed(lambda: DragonQueen.minimax_ab(
+                        node, maxdepth=depth, ordering=DragonQueen.MoveOrdering(), stats=stats, engine=engine))
+                    results.append({'benchmark': 'minimax_ab', 'position': name, 'class': cls.__name__,
+                                    'depth': depth, 'engine': engine, 'value': _json_value(value),
+                                    'nodes': stats.nodes,
+                                    'cutoffs': stats.cutoffs, 'seconds': seconds,
+                                    'nodes_per_second': stats.nodes / seconds})
+    return results
+
+
+def main():
+    if len(argv) == 1:
+        perft_depth, search_depth, file_name = 4, 4, None
+    elif len(argv) in (3, 4):
+        perft_depth, search_depth = int(argv[1]), int(argv[2])
+        file_name = argv[3] if len(argv) == 4 else None
+    else:
+        print("Usage: python " + str(argv[0]) + " [perft_depth search_depth [output_file_name]]")
+        exit(1)
+        return
+
+    perft_results, ok = run_perft(perft_depth)
+    check_results, checks_ok = run_checks()
+    report = {
+        'date': dt.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'perft_passed': ok,
+        'perft': perft_results,
+        'checks_passed': checks_ok,
+        'checks': check_results,
+        'speed': run_speed(range(1, search_depth + 1)),
+    }
+    s = json.dumps(report, indent=2)
+    print(s)
+    if file_name is not None:
+        with open(file_name, "w") as f:
+            f.write(s + "\n")
+    if not ok or not checks_ok:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import jin_DragonQueen as DragonQueen
+import datetime as dt
+import sys
+from array import array
+from sys import argv
+
+
+# Offline opening book builder. Every game starts from the same DragonQueen(None) setup, and the full board at the
+# start makes the first plies the most expensive to search. This walks every position reachable in the first
+# plies, searches each one to a fixed depth and stores the best move, so games can play them instantly.
+
+def enumerate_positions(plies):
+    """
+    Lists the distinct positions reachable from the start position in fewer than plies plies; of a position and
+    its mirror image only the first one reached is listed
+    :param plies: number of plies from the start to cover
+    :return: list of DragonQueenBB objects, in order of distance from the start
+    """
+    level = [DragonQueen.DragonQueenBB(None)]
+    seen = set(DragonQueen.canonical_packed(p.packed()) for p in level)
+    positions = list(level)
+    for _ in range(plies - 1):
+        next_level = list()
+        for node in level:
+            for child in node.iter_successors():
+                key = child.packed()
+                if key is None or child.isTerminal():
+                    continue
+                key = DragonQueen.canonical_packed(key)
+                if key in seen:
+                    continue
+                seen.add(key)
+                next_level.append(child)
+        positions.extend(next_level)
+        level = next_level
+    return positions
+
+
+def build(plies=4, depth=8, tablebase=None, verbose=True):
+    """
+    Searches every book position to a fixed depth
+    :param plies: number of plies from the start to cover
+    :param depth: search depth for each position
+    :param tablebase: Tablebase to search with, or None
+    :param verbose: print progress
+    :return: dict of canonical packed position to encoded best move for that orientation
+    """
+    positions = enumerate_positions(plies)
+    if verbose:
+        print("Positions: " + str(len(positions)))
+    tt = DragonQueen.TranspositionTable()
+    ordering = DragonQueen.MoveOrdering()
+    book = dict()
+    for i, node in enumerate(positions):
+        value, state = DragonQueen.iterative_deepening(node, maxdepth=depth, tt=tt, ordering=ordering,
+                                                       tablebase=tablebase)
+        if state is None:
+            continue
+        move = [m for m in node.legal_moves() if node.apply_move(m) == state][0]
+        key = DragonQueen.canonical_packed(node.packed())
+        if key != node.packed():
+            move = DragonQueen.mirror_move(move)
+        book[key] = DragonQueen.OpeningBook.encode_move(move)
+        if verbose and (i + 1) % 100 == 0:
+            print(str(i + 1) + " / " + str(len(positions)))
+    return book
+
+
+def write(file_name, book, plies, depth):
+    """
+    Writes an opening book in the format read by jin_DragonQueen.OpeningBook
+    :return: None
+    """
+    keys = array('Q', sorted(book))
+    moves = array('H', [book[k] for k in keys])
+    if sys.byteorder == 'big':
+        keys.byteswap()
+        moves.byteswap()
+    with open(file_name, 'wb') as f:
+        f.write(DragonQueen.OpeningBook.HEADER.pack(DragonQueen.OpeningBook.MAGIC, plies, depth, len(keys)))
+        keys.tofile(f)
+        moves.tofile(f)
+
+
+def main():
+    if len(argv) == 1:
+        plies, depth = 4, 8
+        file_name = DragonQueen.BOOK_FILE
+    elif len(argv) in (3, 4):
+        plies, depth = int(argv[1]), int(argv[2])
+        file_name = argv[3] if len(argv) == 4 else DragonQueen.BOOK_FILE
+    else:
+        print("Usage: python " + str(argv[0]) + " [plies depth [output_file_name]]")
+        exit(1)
+        return
+
+    start = dt.datetime.utcnow()
+    book = build(plies, depth, DragonQueen.Tablebase.load(DragonQueen.TABLEBASE_FILE))
+    write(file_name, book, plies, depth)
+    print("Wrote " + file_name + " in " + str(dt.datetime.utcnow() - start))
+
+
+if __name__ == "__main__":
+    main()
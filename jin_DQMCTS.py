@@ -0,0 +1,408 @@
+import jin_DragonQueen as DragonQueen
+import datetime as dt
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sys import argv
+
+
+# Monte Carlo tree search (UCT) for DragonQueen.
+#
+# Past depth 7 the branching factor makes exhaustive minimax too slow, so instead the tree is grown one node per
+# playout towards the moves that have scored best so far, balanced against how rarely they have been tried
+# (UCB1). Every playout plays the game out to the end with a playout policy and the result is backed up along
+# the path. Rewards are always counted for Wights: 1 for a win, 0 for a loss and 0.5 for a draw.
+#
+# Playouts are run in batches. Nodes on the path to a leaf that is waiting for its playout get a virtual loss,
+# so the rest of the batch spreads out over other leaves, and the batch is farmed out to a process pool.
+
+def random_policy(node, moves, rng):
+    """
+    Playout policy: a uniformly random move
+    :param node: position to move in
+    :param moves: its legal moves, not empty
+    :param rng: random.Random
+    :return: one of moves
+    """
+    return rng.choice(moves)
+
+
+def capture_policy(node, moves, rng):
+    """
+    Playout policy: takes the queen if possible, otherwise a random capture, otherwise a random move
+    :param node: position to move in
+    :param moves: its legal moves, not empty
+    :param rng: random.Random
+    :return: one of moves
+    """
+    captures = [m for m in moves if m[2] is not None]
+    if len(captures) <= 0:
+        return rng.choice(moves)
+    for m in captures:
+        if m[2] == 'Q':
+            return m
+    return rng.choice(captures)
+
+
+PLAYOUT_POLICIES = {'random': random_policy, 'capture': capture_policy}
+
+
+def reward(node):
+    """
+    Scores a finished game for Wights
+    :param node: terminal position, or one with no legal moves
+    :return: 1.0 Wights win, 0.0 Dragons win, 0.5 draw
+    """
+    if node.winFor('W'):
+        return 1.0
+    elif node.winFor('D'):
+        return 0.0
+    return 0.5
+
+
+def playout(node, policy, rng):
+    """
+    Plays a game out to the end
+    :param node: DragonQueen or DragonQueenBB to start from; it is not modified
+    :param policy: function (node, moves, rng) -> move
+    :param rng: random.Random
+    :return: reward for Wights
+    """
+    inplace = hasattr(node, 'make_move')
+    n = node.copy() if inplace else node
+    while not n.isTerminal():
+        moves = n.legal_moves()
+        if len(moves) <= 0:
+            break
+        m = policy(n, moves, rng)
+        if inplace:
+            n.make_move(m)
+        else:
+            n = n.apply_move(m)
+    return reward(n)
+
+
+def _run_playouts(jobs, policy):
+    """
+    Runs a batch of playouts, in a worker process or in this one
+    :param jobs: list of (node, seed) pairs
+    :param policy: playout policy function, or its name in PLAYOUT_POLICIES
+    :return: list of rewards, in job order
+    """
+    if not callable(policy):
+        policy = PLAYOUT_POLICIES[policy]
+    return [playout(node, policy, random.Random(seed)) for node, seed in jobs]
+
+
+class TreeNode:
+    """
+    A position in the search tree with its playout statistics
+    """
+    def __init__(self, state, parent=None, move=None):
+        """
+        :param state: DragonQueen or DragonQueenBB
+        :param parent: TreeNode of the position before move, or None for the root
+        :param move: the move from the parent, or None for the root
+        """
+        self.state = state
+        self.parent = parent
+        self.move = move
+        self.children = list()
+        # Moves not expanded yet; None until the node is first selected
+        self.untried = None
+        self.visits = 0
+        self.reward = 0.0
+        # Playouts below this node that have been started but not backed up yet (virtual losses)
+        self.pending = 0
+        # Exact reward of a terminal or tablebase position, which needs no playouts
+        self.exact = None
+
+    def mean(self):
+        """
+        :return: average reward for Wights of the playouts through this node
+        """
+        return self.reward / self.visits if self.visits > 0 else 0.5
+
+
+class MCTS:
+    """
+    UCT search that keeps its tree between moves
+    """
+    def __init__(self, exploration=1.4, policy='random', workers=1, batch=None, seed=None, tablebase=None):
+        """
+        :param exploration: UCB1 exploration constant
+        :param policy: playout policy, a name in PLAYOUT_POLICIES or a function (node, moves, rng) -> move;
+            with more than one worker a function must be picklable, i.e. defined at module level
+        :param workers: number of processes running playouts; 1 runs them in this process, None uses
+            one per CPU
+        :param batch: playouts started before their results are backed up, defaults to 16 per worker
+        :param seed: seed for move order and playouts; with a node budget the search is then reproducible
+        :param tablebase: Tablebase giving exact results for covered positions instead of playouts
+        """
+        self.exploration = exploration
+        self.policy = policy
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.batch = batch if batch is not None else 16 * workers
+        self.rng = random.Random(seed)
+        self.tablebase = tablebase
+        self.root = None
+        self.playouts = 0
+
+    def close(self):
+        """
+        Shuts down the worker processes
+        :return: None
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def search(self, node, seconds=None, nodes=None):
+        """
+        Grows the tree from node and picks the most visited move
+        :param node: DragonQueen or DragonQueenBB to move in
+        :param seconds: wall-clock budget, or None
+        :param nodes: playout budget, or None; 1000 playouts if neither budget is given
+        :return: the average reward for Wights of the chosen move, the game state after it; 0.5, None if
+            there are no legal moves
+        """
+        if seconds is None and nodes is None:
+            nodes = 1000
+        self.root = self._reuse(node)
+        if self.root.untried is None:
+            self._evaluate(self.root)
+        if self.root.exact is not None:
+            # A tablebase position still has moves to choose from; its children's exact results decide
+            return self._exact_choice()
+        # A playout costs far more than reading the clock, so the time is checked before every batch
+        deadline = None if seconds is None else time.time() + seconds
+        started = 0
+        while (nodes is None or started < nodes) and (deadline is None or time.time() < deadline):
+            leaves = list()
+            size = self.batch if nodes is None else min(self.batch, nodes - started)
+            for _ in range(size):
+                started += 1
+                leaf = self._select()
+                if leaf.exact is not None:
+                    self._backup(leaf, leaf.exact)
+                else:
+                    leaves.append(leaf)
+            if len(leaves) > 0:
+                for leaf, r in zip(leaves, self._playouts([leaf.state for leaf in leaves])):
+                    self._backup(leaf, r)
+
+        if len(self.root.children) <= 0:
+            return 0.5, None
+        best = self.root.children[0]
+        for child in self.root.children:
+            if child.visits > best.visits:
+                best = child
+        return best.mean(), best.state
+
+    def _exact_choice(self):
+        """
+        Picks a move at a root whose result is already known, i.e. a finished game or a tablebase position, by
+        the exact results of its children. The tablebase counts the 50-ply draw, so always keeping a won result
+        also makes progress towards the win.
+        :return: the reward for Wights of the chosen move, the game state after it; 0.5, None if there are no
+            legal moves
+        """
+        t = self.root
+        for m in t.untried:
+            child = TreeNode(t.state.apply_move(m), t, m)
+            t.children.append(child)
+            self._evaluate(child)
+        t.untried = list()
+        maximize = t.state.isMaxNode()
+        best, best_reward = None, None
+        for c in t.children:
+            r = c.exact if c.exact is not None else c.mean()
+            if best is None or (r > best_reward if maximize else r < best_reward):
+                best, best_reward = c, r
+        if best is None:
+            return 0.5, None
+        return best_reward, best.state
+
+    def _reuse(self, node):
+        """
+        Finds node among the positions already in the tree, up to two plies below the old root
+        :param node: position to search from
+        :return: TreeNode to use as the new root
+        """
+        if self.root is not None:
+            candidates = [self.root] + self.root.children
+            candidates += [g for c in self.root.children for g in c.children]
+            for t in candidates:
+                if self._same(t.state, node):
+                    t.parent = None
+                    t.move = None
+                    return t
+        return TreeNode(node)
+
+    @staticmethod
+    def _same(a, b):
+        return a.countPlies == b.countPlies and a.whoseTurn == b.whoseTurn and a.packed() == b.packed() and \
+            a.isTerminal() == b.isTerminal()
+
+    def _select(self):
+        """
+        Walks down the tree by UCB1 and expands one new child, adding a virtual loss on the way
+        :return: TreeNode of the new leaf
+        """
+        t = self.root
+        while True:
+            t.pending += 1
+            if t.exact is not None:
+                return t
+            if t.untried is None:
+                self._evaluate(t)
+                if t.exact is not None:
+                    return t
+            if len(t.untried) > 0:
+                m = t.untried.pop()
+                child = TreeNode(t.state.apply_move(m), t, m)
+                t.children.append(child)
+                child.pending += 1
+                self._evaluate(child)
+                return child
+            t = self._best_child(t)
+
+    def _evaluate(self, t):
+        """
+        Fills in the untried moves of a new node, or its exact reward if the game is over or in the tablebase
+        :param t: TreeNode
+        :return: None
+        """
+        state = t.state
+        moves = list() if state.isTerminal() else state.legal_moves()
+        if len(moves) <= 0:
+            t.exact = reward(state)
+        elif self.tablebase is not None:
+            value = self.tablebase.probe(state)
+            if value is not None:
+                t.exact = 1.0 if value > 0 else 0.0 if value < 0 else 0.5
+        # Expand in a random order, so the first playouts are not biased towards generation order
+        self.rng.shuffle(moves)
+        t.untried = moves
+
+    def _best_child(self, t):
+        """
+        Picks the child with the highest UCB1 score for the player to move at t
+        :param t: fully expanded TreeNode
+        :return: TreeNode
+        """
+        maximize = t.state.isMaxNode()
+        log_visits = math.log(t.visits + t.pending)
+        best, best_score = None, None
+        for c in t.children:
+            n = c.visits + c.pending
+            # Pending playouts count as losses for the player choosing
+            w = c.reward + (0 if maximize else c.pending)
+            q = w / n if maximize else 1.0 - w / n
+            score = q + self.exploration * math.sqrt(log_visits / n)
+            if best is None or score > best_score:
+                best, best_score = c, score
+        return best
+
+    def _backup(self, leaf, r):
+        """
+        Adds a playout result to every node from leaf up to the root and takes back its virtual loss
+        :param leaf: TreeNode the playout started from
+        :param r: reward for Wights
+        :return: None
+        """
+        self.playouts += 1
+        t = leaf
+        while t is not None:
+            t.visits += 1
+            t.reward += r
+            t.pending -= 1
+            t = t.parent
+
+    def _playouts(self, states):
+        """
+        Runs one playout from each state, spread over the worker processes
+        :param states: list of positions
+        :return: list of rewards, in the same order
+        """
+        jobs = [(s, self.rng.getrandbits(32)) for s in states]
+        if self.pool is None:
+            return _run_playouts(jobs, self.policy)
+        size = max(1, math.ceil(len(jobs) / self.workers))
+        chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+        results = list()
+        for rewards in self.pool.map(_run_playouts, chunks, [self.policy] * len(chunks)):
+            results.extend(rewards)
+        return results
+
+
+def mcts(node, seconds=None, nodes=None, exploration=1.4, policy='random', workers=1, seed=None, tablebase=None):
+    """
+    One-off MCTS search with a fresh tree, with the same return contract as minimax_ab
+    :param node: DragonQueen or DragonQueenBB to move in
+    :param seconds: wall-clock budget, or None
+    :param nodes: playout budget, or None
+    :param exploration: UCB1 exploration constant
+    :param policy: playout policy, as for MCTS
+    :param workers: number of playout processes, as for MCTS
+    :param seed: random seed
+    :param tablebase: Tablebase, or None
+    :return: the average reward for Wights of the chosen move, the game state after it
+    """
+    search = MCTS(exploration, policy, workers, seed=seed, tablebase=tablebase)
+    try:
+        return search.search(node, seconds, nodes)
+    finally:
+        search.close()
+
+
+def main():
+    if len(argv) == 1:
+        seconds, workers = 5.0, None
+    elif len(argv) in (2, 3):
+        seconds = float(argv[1])
+        workers = int(argv[2]) if len(argv) == 3 else None
+    else:
+        print("Usage: python " + str(argv[0]) + " [seconds_per_move [workers]]")
+        exit(1)
+        return
+
+    # MCTS plays the Wights against iterative deepening alpha-beta for the Dragons, same time per move
+    tablebase = DragonQueen.Tablebase.load(DragonQueen.TABLEBASE_FILE)
+    search = MCTS(policy='capture', workers=workers, tablebase=tablebase)
+    tt = DragonQueen.TranspositionTable()
+    ordering = DragonQueen.MoveOrdering()
+    cur = DragonQueen.DragonQueenBB(None)
+    start = dt.datetime.utcnow()
+    try:
+        while not cur.isTerminal():
+            cur.display()
+            if cur.isMaxNode():
+                value, next_move = search.search(cur, seconds=seconds)
+                print("MCTS: " + str(search.root.visits) + " playouts, Wights score " + str(round(value, 3)))
+            else:
+                _, next_move = DragonQueen.iterative_deepening(cur, seconds=seconds, tt=tt, ordering=ordering,
+                                                               tablebase=tablebase)
+            if next_move is None:
+                break
+            cur = next_move
+    finally:
+        search.close()
+    cur.display()
+
+    if cur.winFor('D'):
+        print("Dragons Win!")
+    elif cur.winFor('W'):
+        print("Wights Win!")
+    else:
+        print("Draw.")
+    print(dt.datetime.utcnow() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import jin_DragonQueen as DragonQueen
+import datetime as dt
+import itertools
+import sys
+from array import array
+from sys import argv
+
+from jin_DragonQueen import BIT, DIAGONAL_MASKS, DIAGONAL_SQUARES, KING_MASKS, KING_SQUARES, ORTHOGONAL_MASKS, \
+    ORTHOGONAL_SQUARES, ROW_5, bit_squares, canonical_packed, pack_position, popcount
+
+
+# Retrograde analysis of reduced-material DragonQueen endgames.
+#
+# Every covered position (queen plus up to max_dragons dragons against 1 to max_wights wights, at most max_pieces
+# pieces besides the queen, either side to move) is enumerated with a count of its legal moves. Positions that
+# win on the spot -- the queen steps onto row 5, or a wight takes the queen -- are won in 1 ply. Working outwards
+# one ply at a time, every predecessor of a decided position is found by un-making moves: if the predecessor's
+# mover is the winner it wins one ply later, otherwise one of its moves is spent, and once all of them lead to
+# wins for the other side it is lost one ply later. What is never decided is a draw. The 50-ply limit is ignored
+# while solving; Tablebase.probe() applies it at lookup time.
+
+def enumerate_positions(max_dragons, max_wights, max_pieces):
+    """
+    Lists all non-terminal covered positions, Wights to move first
+    :return: generator of (queen, dragons, wights, player) tuples
+    """
+    for num_dragons in range(0, max_dragons + 1):
+        for num_wights in range(1, min(max_wights, max_pieces - num_dragons) + 1):
+            for q in range(20):
+                others = [sq for sq in range(25) if sq != q]
+                for ds in itertools.combinations(others, num_dragons):
+                    dragons = sum(BIT[sq] for sq in ds)
+                    rest = [sq for sq in others if not BIT[sq] & dragons]
+                    for ws in itertools.combinations(rest, num_wights):
+                        wights = sum(BIT[sq] for sq in ws)
+                        yield BIT[q], dragons, wights, 'W'
+                        yield BIT[q], dragons, wights, 'D'
+
+
+def count_moves(queen, dragons, wights, player):
+    """
+    Counts legal moves and checks for a move that wins on the spot
+    :return: number of legal moves, True if one of them wins immediately
+    """
+    if player == 'D':
+        own = queen | dragons
+        moves = sum(popcount(KING_MASKS[sq] & ~own) for sq in bit_squares(own))
+        return moves, KING_MASKS[queen.bit_length() - 1] & ROW_5 & ~own != 0
+    else:
+        empty = ~(queen | dragons | wights)
+        moves = 0
+        for sq in bit_squares(wights):
+            moves += popcount(ORTHOGONAL_MASKS[sq] & empty) + popcount(DIAGONAL_MASKS[sq] & (queen | dragons))
+        return moves, DIAGONAL_MASKS[queen.bit_length() - 1] & wights != 0
+
+
+def unmoves(queen, dragons, wights, player, covers):
+    """
+    Lists the non-terminal positions one move before this one
+    :param covers: function (num_dragons, num_wights) -> boolean, the material kept in the tablebase
+    :return: list of (queen, dragons, wights, player) tuples, with the other player to move
+    """
+    previous = list()
+    empty = ~(queen | dragons | wights) & ((1 << 25) - 1)
+    num_dragons, num_wights = popcount(dragons), popcount(wights)
+    if player == 'W':
+        # Dragons moved: the queen or a dragon stepped onto its square, possibly taking a wight there
+        wights_back = covers(num_dragons, num_wights + 1)
+        for y in bit_squares(queen | dragons):
+            for x in KING_SQUARES[y]:
+                if not BIT[x] & empty:
+                    continue
+                if queen & BIT[y]:
+                    if BIT[x] & ROW_5:
+                        continue
+                    q, d = BIT[x], dragons
+                else:
+                    q, d = queen, dragons ^ BIT[x] ^ BIT[y]
+                previous.append((q, d, wights, 'D'))
+                if wights_back:
+                    previous.append((q, d, wights | BIT[y], 'D'))
+    else:
+        # Wights moved: a wight stepped straight onto an empty square, or diagonally taking a dragon
+        dragons_back = covers(num_dragons + 1, num_wights)
+        for y in bit_squares(wights):
+            for x in ORTHOGONAL_SQUARES[y]:
+                if BIT[x] & empty:
+                    previous.append((queen, dragons, wights ^ BIT[x] ^ BIT[y], 'W'))
+            if dragons_back:
+                for x in DIAGONAL_SQUARES[y]:
+                    if BIT[x] & empty:
+                        previous.append((queen, dragons | BIT[y], wights ^ BIT[x] ^ BIT[y], 'W'))
+    return previous
+
+
+def solve(max_dragons=2, max_wights=3, max_pieces=3, max_distance=49, verbose=True):
+    """
+    Solves all covered positions by retrograde analysis
+    :param max_dragons: most dragons in a covered position
+    :param max_wights: most wights in a covered position
+    :param max_pieces: most dragons and wights together
+    :param max_distance: longest win to keep, in plies; longer wins cannot finish before the 50-ply draw
+    :param verbose: print progress
+    :return: dict mapping packed position to signed distance to win (positive: Wights win)
+    """
+    def covers(num_dragons, num_wights):
+        return num_dragons <= max_dragons and 0 < num_wights <= max_wights and num_dragons + num_wights <= max_pieces
+
+    remaining = dict()  # undecided position -> moves not yet known to lose
+    result = dict()     # decided position -> signed distance to win
+    frontier = list()
+    for position in enumerate_positions(max_dragons, max_wights, max_pieces):
+        key = pack_position(*position)
+        moves, wins_now = count_moves(*position)
+        if wins_now:
+            result[key] = 1 if position[3] == 'W' else -1
+            frontier.append(position)
+        else:
+            remaining[key] = moves
+    if verbose:
+        print("Positions: " + str(len(remaining) + len(result)))
+
+    distance = 1
+    while frontier and distance < max_distance:
+        if verbose:
+            print("Distance " + str(distance) + ": " + str(len(frontier)) + " positions")
+        next_frontier = list()
+        for position in frontier:
+            key = pack_position(*position)
+            winner = 'W' if result[key] > 0 else 'D'
+            for prev in unmoves(*position, covers):
+                prev_key = pack_position(*prev)
+                if prev_key not in remaining:
+                    continue
+                if prev[3] == winner:
+                    decided = True
+                else:
+                    remaining[prev_key] -= 1
+                    decided = remaining[prev_key] == 0
+                if decided:
+                    del remaining[prev_key]
+                    result[prev_key] = distance + 1 if winner == 'W' else -(distance + 1)
+                    next_frontier.append(prev)
+        frontier = next_frontier
+        distance += 1
+
+    if verbose:
+        print("Wins: " + str(len(result)) + ", draws or longer than " + str(max_distance) + " plies: " +
+              str(len(remaining)))
+    return result
+
+
+def write(file_name, result, max_dragons, max_wights, max_pieces):
+    """
+    Writes a solved tablebase in the format read by jin_DragonQueen.Tablebase, keeping only the canonical one of
+    each pair of mirror images
+    :return: None
+    """
+    keys = array('Q', sorted(k for k in result if k == canonical_packed(k)))
+    distances = array('b', [result[k] for k in keys])
+    if sys.byteorder == 'big':
+        keys.byteswap()
+    with open(file_name, 'wb') as f:
+        f.write(DragonQueen.Tablebase.HEADER.pack(DragonQueen.Tablebase.MAGIC, max_dragons, max_wights, max_pieces,
+                                                  len(keys)))
+        keys.tofile(f)
+        distances.tofile(f)
+
+
+def main():
+    if len(argv) == 1:
+        max_dragons, max_wights, max_pieces = 2, 3, 3
+        file_name = DragonQueen.TABLEBASE_FILE
+    elif len(argv) in (4, 5):
+        max_dragons, max_wights, max_pieces = int(argv[1]), int(argv[2]), int(argv[3])
+        file_name = argv[4] if len(argv) == 5 else DragonQueen.TABLEBASE_FILE
+    else:
+        print("Usage: python " + str(argv[0]) + " [max_dragons max_wights max_pieces [output_file_name]]")
+        exit(1)
+        return
+
+    start = dt.datetime.utcnow()
+    result = solve(max_dragons, max_wights, max_pieces)
+    write(file_name, result, max_dragons, max_wights, max_pieces)
+    print("Wrote " + file_name + " in " + str(dt.datetime.utcnow() - start))
+
+
+if __name__ == "__main__":
+    main()
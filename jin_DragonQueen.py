@@ -1,7 +1,168 @@
 import datetime as dt
+import itertools
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Bitboard layout: square 5 * (r - 1) + (c - 1) holds board position (r, c), so bit 0 is (1, 1)
+# and bit 24 is (5, 5). Scanning bits from low to high visits the board in row-major order.
+def square(r, c):
+    return 5 * (r - 1) + (c - 1)
+
+
+def grid(sq):
+    return sq // 5 + 1, sq % 5 + 1
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def bit_squares(mask):
+    """
+    Lists the squares set in a bitboard, lowest first
+    :param mask: bitboard
+    :return: list of square numbers
+    """
+    squares = list()
+    while mask:
+        low = mask & -mask
+        squares.append(low.bit_length() - 1)
+        mask ^= low
+    return squares
+
+
+ROW_5 = 0b11111 << 20
+BIT = [1 << sq for sq in range(25)]
+
+
+def _steps(sq, orthogonal, diagonal):
+    r, c = grid(sq)
+    steps = list()
+    for r_to in range(max(r - 1, 1), min(r + 1, 5) + 1):
+        for c_to in range(max(c - 1, 1), min(c + 1, 5) + 1):
+            is_diagonal = r_to != r and c_to != c
+            if (r_to, c_to) != (r, c) and (diagonal if is_diagonal else orthogonal):
+                steps.append(square(r_to, c_to))
+    return steps
+
+
+# Precomputed neighbour tables, in row-major order so generated moves come out in the same order as the
+# original 25-square probe: orthogonal steps (wight moves), diagonal steps (wight captures) and king steps
+# (dragon and queen moves)
+ORTHOGONAL_SQUARES = [_steps(sq, True, False) for sq in range(25)]
+DIAGONAL_SQUARES = [_steps(sq, False, True) for sq in range(25)]
+KING_SQUARES = [_steps(sq, True, True) for sq in range(25)]
+ORTHOGONAL_MASKS = [sum(1 << to for to in steps) for steps in ORTHOGONAL_SQUARES]
+DIAGONAL_MASKS = [sum(1 << to for to in steps) for steps in DIAGONAL_SQUARES]
+KING_MASKS = [sum(1 << to for to in steps) for steps in KING_SQUARES]
+# Wight destinations from each square with a flag for diagonal (capture only) steps
+WIGHT_SQUARES = [[(to, to in DIAGONAL_SQUARES[sq]) for to in KING_SQUARES[sq]] for sq in range(25)]
+
+# The same tables keyed by (r, c) board position, for the dict-based DragonQueen
+KING_STEPS = {grid(sq): [grid(to) for to in KING_SQUARES[sq]] for sq in range(25)}
+WIGHT_STEPS = {grid(sq): [(grid(to), diagonal) for to, diagonal in WIGHT_SQUARES[sq]] for sq in range(25)}
+
+# Heuristic contribution of a single piece, scaled by 5 so that scores stay exact integers
+QUEEN_SCORE = [-5 * (sq // 5 + 3) for sq in range(25)]
+WIGHT_SCORE = [5 + (5 - sq // 5) for sq in range(25)]
+
+MASK_25 = (1 << 25) - 1
+
+
+def pack_position(queen, dragons, wights, player):
+    """
+    Packs a position with a queen on the board into one int: queen square in bits 0-4, dragons in bits 5-29,
+    wights in bits 30-54 and bit 55 set when Dragons are to move
+    :param queen: queen bitboard, must not be empty
+    :param dragons: dragons bitboard
+    :param wights: wights bitboard
+    :param player: 'D' or 'W', the side to move
+    :return: int below 2 ** 56
+    """
+    key = (queen.bit_length() - 1) | dragons << 5 | wights << 30
+    if player == 'D':
+        key |= 1 << 55
+    return key
+
+
+# The rules, the start position and the heuristic are all symmetric under reflection in the centre column, so
+# a position and its mirror image have the same value and mirrored best moves. Caches and tables keep only one
+# of each pair, the canonical one with the smaller key.
+MIRROR_SQUARES = [5 * (sq // 5) + 4 - sq % 5 for sq in range(25)]
+_REVERSED_ROWS = [int(format(bits, '05b')[::-1], 2) for bits in range(32)]
+
+
+def mirror_mask(mask):
+    """
+    Reflects a bitboard in the centre column
+    :param mask: 25-bit bitboard
+    :return: 25-bit bitboard
+    """
+    return _REVERSED_ROWS[mask & 31] | _REVERSED_ROWS[mask >> 5 & 31] << 5 | _REVERSED_ROWS[mask >> 10 & 31] << 10 | \
+        _REVERSED_ROWS[mask >> 15 & 31] << 15 | _REVERSED_ROWS[mask >> 20 & 31] << 20
+
+
+def mirror_move(move):
+    """
+    Reflects a move in the centre column
+    :param move: (from, to, captured) tuple with square numbers or board positions
+    :return: (from, to, captured) tuple of the same kind
+    """
+    fromsq, tosq, captured = move
+    if isinstance(fromsq, tuple):
+        return (fromsq[0], 6 - fromsq[1]), (tosq[0], 6 - tosq[1]), captured
+    return MIRROR_SQUARES[fromsq], MIRROR_SQUARES[tosq], captured
+
+
+def canonical_packed(key):
+    """
+    Picks the canonical one of a packed position and its mirror image
+    :param key: int from pack_position()
+    :return: the smaller of key and the packed mirror image
+    """
+    mirrored = MIRROR_SQUARES[key & 0b11111] | mirror_mask(key >> 5 & MASK_25) << 5 | \
+        mirror_mask(key >> 30 & MASK_25) << 30 | key & 1 << 55
+    return min(key, mirrored)
+
+
+def unpack_position(key):
+    """
+    Reverses pack_position()
+    :param key: int from pack_position()
+    :return: queen, dragons and wights bitboards, the side to move
+    """
+    return 1 << (key & 0b11111), key >> 5 & MASK_25, key >> 30 & MASK_25, 'D' if key >> 55 & 1 else 'W'
+
+
+# Zobrist keys: one random 64-bit number per (piece, square) plus one for Dragons to move. A fixed seed keeps
+# keys, and so table contents and search results, reproducible between runs.
+_zobrist_random = random.Random(20160425)
+ZOBRIST = {p: [_zobrist_random.getrandbits(64) for _ in range(25)] for p in 'QDW'}
+ZOBRIST_D_TO_MOVE = _zobrist_random.getrandbits(64)
+# Mixed into the key of positions whose value depends on the ply count (see minimax_ab)
+ZOBRIST_PLY = [_zobrist_random.getrandbits(64) for _ in range(64)]
+# Keys of the mirror image: hashing a position with these gives the Zobrist key of its reflection
+ZOBRIST_MIRROR = {p: [ZOBRIST[p][MIRROR_SQUARES[sq]] for sq in range(25)] for p in 'QDW'}
+
 
 class DragonQueen:
-    def __init__(self, state, player='W', countplies=1):
+    def __init__(self, state, player='W', countplies=1, pieces=None):
+        """
+        :param state: None for the start position, or a dict mapping (r, c) to 'Q', 'D', 'W' or '.'
+        :param player: 'D' or 'W', the side to move
+        :param countplies: ply number of this position
+        :param pieces: (queen position, dragon positions, wight positions, score) for state if the caller
+            already has them, found by scanning the board otherwise
+        """
         if state is None:
             self.gameState = dict()
             for r in range(1, 6):
@@ -16,10 +177,29 @@ class DragonQueen:
             self.gameState = state
 
         self.whoseTurn = player
-        self.cachedWin = False
-        self.cachedWinner = None
         self.countPlies = countplies
 
+        # Piece positions (in row-major order) and the heuristic score, scaled by 5 to keep it an exact
+        # integer, are kept up to date by apply_move() so that no query has to rescan the board
+        if pieces is None:
+            self.queenPos = None
+            self.dragonPos = list()
+            self.wightPos = list()
+            self.score = 0
+            for pos in sorted(self.gameState):
+                piece = self.gameState[pos]
+                if piece == 'Q':
+                    self.queenPos = pos
+                    self.score += QUEEN_SCORE[square(*pos)]
+                elif piece == 'D':
+                    self.dragonPos.append(pos)
+                    self.score -= 5
+                elif piece == 'W':
+                    self.wightPos.append(pos)
+                    self.score += WIGHT_SCORE[square(*pos)]
+        else:
+            self.queenPos, self.dragonPos, self.wightPos, self.score = pieces
+
     def __str__(self):
         s = ""
         for r in range(1, 6):
@@ -44,18 +224,82 @@ class DragonQueen:
         Returns all successor states to the current one
         :return: list of DragonQueen objects or an empty list if this is a terminal node
         """
+        return list(self.iter_successors())
+
+    def iter_successors(self):
+        """
+        Yields the successor states one at a time, so a caller that stops early never builds the rest
+        :return: generator of DragonQueen objects, empty if this is a terminal node
+        """
+        for m in self.iter_moves():
+            yield self.apply_move(m)
+
+    def legal_moves(self):
+        """
+        Generates the legal moves for the player to move from the precomputed neighbour tables
+        :return: list of (from, to, captured) tuples, where from and to are board positions and captured
+            is the piece taken ('W', 'D' or 'Q') or None; empty if this is a terminal node
+        """
+        return list(self.iter_moves())
+
+    def iter_moves(self):
+        """
+        Yields the legal moves one at a time, in the same order as legal_moves()
+        :return: generator of (from, to, captured) tuples
+        """
         if self.isTerminal():
-            return list()
-        all_pieces = self.all_pieces(self.whoseTurn)
-        all_positions = list(self.gameState.keys())
-        next_player = self.togglePlayer(self.whoseTurn)
-        states = list()
-        for p in all_pieces:
-            for pos in all_positions:
-                states.append(self.move(p, pos))
-        states = filter((lambda s: s is not None), states)
-        nodes = [DragonQueen(s, next_player, self.countPlies + 1) for s in states]
-        return nodes
+            return
+        board = self.gameState
+        if self.whoseTurn == 'D':
+            for p in self.all_pieces('D'):
+                for to in KING_STEPS[p]:
+                    target = board[to]
+                    if target == '.':
+                        yield p, to, None
+                    elif target == 'W':
+                        yield p, to, target
+        else:
+            for p in self.all_pieces('W'):
+                for to, diagonal in WIGHT_STEPS[p]:
+                    target = board[to]
+                    if diagonal:
+                        if target == 'D' or target == 'Q':
+                            yield p, to, target
+                    elif target == '.':
+                        yield p, to, None
+
+    def apply_move(self, move):
+        """
+        Plays a move from legal_moves()
+        :param move: (from, to, captured) tuple
+        :return: DragonQueen object for the position after the move
+        """
+        fromgrid, togrid, captured = move
+        newstate = self.gameState.copy()
+        piece = newstate[fromgrid]
+        newstate[togrid] = piece
+        newstate[fromgrid] = '.'
+
+        queen, dragons, wights, score = self.queenPos, self.dragonPos, self.wightPos, self.score
+        if piece == 'W':
+            wights = sorted([togrid if p == fromgrid else p for p in wights])
+            score += WIGHT_SCORE[square(*togrid)] - WIGHT_SCORE[square(*fromgrid)]
+        elif piece == 'D':
+            dragons = sorted([togrid if p == fromgrid else p for p in dragons])
+        else:
+            queen = togrid
+            score += QUEEN_SCORE[square(*togrid)] - QUEEN_SCORE[square(*fromgrid)]
+        if captured == 'W':
+            wights = [p for p in wights if p != togrid]
+            score -= WIGHT_SCORE[square(*togrid)]
+        elif captured == 'D':
+            dragons = [p for p in dragons if p != togrid]
+            score += 5
+        elif captured == 'Q':
+            queen = None
+            score -= QUEEN_SCORE[square(*togrid)]
+        return DragonQueen(newstate, self.togglePlayer(self.whoseTurn), self.countPlies + 1,
+                           (queen, dragons, wights, score))
 
     def utility(self):
         """
@@ -72,26 +316,12 @@ class DragonQueen:
     def heuristic(self):
         """
         Returns the estimate of utility for a non-terminal node
+          -2 points for queen piece on board plus -1 to -5 based on distance from goal
+          -1 point for each dragon piece on board
+          +1 point for each wight piece on the board plus 1/5 to 1 based on distance from opposite home row
         :return: float in the range -10.0 to +10.0
         """
-        h = 0.0
-        for p in self.all_pieces('D'):
-            r, c = p
-            if self.gameState[p] == 'Q':
-                # -2 points for queen piece on board plus -1 to -5 based on distance from goal
-                h -= r +2
-            else:
-                # 1 point for each dragon piece on board
-                h -= 1
-
-        for p in self.all_pieces('W'):
-            r, c = p
-            # 1 point for each wight piece on the board
-            h += 1
-            # 1 to 5 based on distance from opposite home row
-            h += (6.0 - r) / 5.0
-
-        return h
+        return self.score / 5.0
 
     def winFor(self, player):
         """
@@ -99,19 +329,10 @@ class DragonQueen:
         :param player: 'D' or 'W'
         :return: boolean
         """
-        if self.cachedWin is False:
-            if player == 'D':
-                won = any([self.gameState[5, c] == 'Q' for c in range(1, 6)])
-            else:
-                won = all([self.gameState[r, c] != 'Q' for r in range(1, 6) for c in range(1, 6)])
-            if won:
-                self.cachedWin = True
-                self.cachedWinner = player
-                return True
-            else:
-                return False
+        if player == 'D':
+            return self.queenPos is not None and self.queenPos[0] == 5
         else:
-            return player == self.cachedWinner
+            return self.queenPos is None
 
     def draw(self):
         """
@@ -122,7 +343,7 @@ class DragonQueen:
             return False
         elif self.countPlies >= 50:
             return True
-        elif len(self.all_pieces('W')) == 0:
+        elif len(self.wightPos) == 0:
             return True
         else:
             # TODO: check for other draw conditions
@@ -265,10 +486,21 @@ class DragonQueen:
         new_state[dest] = new_state[piece]
         new_state[piece] = '.'
 
-        new_move = DragonQueen(new_state, self.togglePlayer(self.whoseTurn), self.countPlies + 1)
+        new_move = type(self)(new_state, self.togglePlayer(self.whoseTurn), self.countPlies + 1)
 
         return new_move
 
+    def packed(self):
+        """
+        Packs the position into one int, see pack_position()
+        :return: int, or None if the queen has been captured
+        """
+        if self.queenPos is None:
+            return None
+        dragons = sum(BIT[square(*p)] for p in self.dragonPos)
+        wights = sum(BIT[square(*p)] for p in self.wightPos)
+        return pack_position(BIT[square(*self.queenPos)], dragons, wights, self.whoseTurn)
+
     def all_pieces(self, player):
         """
         Gets the locations of all pieces for a given player
@@ -276,9 +508,11 @@ class DragonQueen:
         :return: List of board positions containing friendly pieces
         """
         if player == 'W':
-            return [v for v in self.gameState if self.gameState[v] == 'W']
+            return list(self.wightPos)
+        elif self.queenPos is None:
+            return list(self.dragonPos)
         else:
-            return [v for v in self.gameState if self.gameState[v] == 'D' or self.gameState[v] == 'Q']
+            return sorted(self.dragonPos + [self.queenPos])
 
     def queen_dist(self, pos):
         """
@@ -287,7 +521,7 @@ class DragonQueen:
         :return:
         """
         r, c = pos
-        q_r, q_c = [v for v in self.gameState if self.gameState[v] == 'Q'][0]
+        q_r, q_c = self.queenPos
 
         return float(abs(q_r - r) + abs(q_c - c))
 
@@ -307,114 +541,1626 @@ class DragonQueen:
         print("Turn: " + self.whoseTurn + ", Ply: " + str(self.countPlies) + "\n")
 
 
-def minimax_ab(node, maxdepth=1, ab_prune=True, telemetry=None):
+class DragonQueenBB(DragonQueen):
     """
-    minimax search with specified depth limit and optional alpha-beta pruning
-    :param node:  a Game object responding to the following methods:
-        str(): return a unique string describing the state of the game
-            (for use in hash table)
-        successors(): returns a list of all legal game states that extend
-            this one by one move
-        isMinNode(): returns True if the node represents a state in which
-            Min is to move
-        isMaxNode(): returns True if the node represents a state in which
-            Max is to move
-        utility(): returns the utility of a terminal node
-        heuristic(): estimates the utility of an non-terminal node
-    :param maxdepth: cutoff depth for search
-    :param ab_prune: use alpha-beta pruning
-    :param telemetry: a telemetry object with a log() function that accepts a node
-    :return: the value of the game state, the game state
+    Bitboard-backed DragonQueen position.
+    The board is three 25-bit integers (queen, dragons, wights) instead of a dict, so a move is a couple
+    of integer operations and a position hashes as a small tuple. Responds to the same methods as
+    DragonQueen, so minimax_ab and the game loop run on it directly.
     """
-    infinity = float('inf')
+    def __init__(self, state, player='W', countplies=1, zobrist=None, score=None, mirror_zobrist=None):
+        """
+        :param state: None for the start position, a (queen, dragons, wights) tuple of bitboards
+            or a DragonQueen gameState dict
+        :param player: 'D' or 'W', the side to move
+        :param countplies: ply number of this position
+        :param zobrist: Zobrist key of the position if the caller already has it, computed otherwise
+        :param score: heuristic score of the position scaled by 5, if the caller already has it
+        :param mirror_zobrist: Zobrist key of the mirror image of the position, if the caller already has it
+        """
+        if state is None:
+            self.queen = 1 << square(1, 3)
+            self.dragons = 0b01110 << 5
+            self.wights = ROW_5
+        elif isinstance(state, dict):
+            self.queen = self.dragons = self.wights = 0
+            for (r, c), piece in state.items():
+                if piece == 'Q':
+                    self.queen |= 1 << square(r, c)
+                elif piece == 'D':
+                    self.dragons |= 1 << square(r, c)
+                elif piece == 'W':
+                    self.wights |= 1 << square(r, c)
+        else:
+            self.queen, self.dragons, self.wights = state
 
-    def minimax_val_ab(node_v, alpha=-infinity, beta=infinity, maxdepth_v=(maxdepth-1)):
+        self.whoseTurn = player
+        self.countPlies = countplies
+        self.zobrist = zobrist if zobrist is not None else self.compute_zobrist()
+        self.mirror_zobrist = mirror_zobrist if mirror_zobrist is not None else self.compute_zobrist(ZOBRIST_MIRROR)
+        self.score = score if score is not None else self.compute_score()
+        self.undo_stack = list()
+
+    def __str__(self):
+        s = ""
+        for sq in range(25):
+            s += self.piece_at(sq)
+        return s
+
+    def __eq__(self, other):
+        return isinstance(other, DragonQueenBB) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def key(self):
+        return self.queen, self.dragons, self.wights, self.whoseTurn
+
+    def packed(self):
         """
-        :param node_v: the root node for search
-        :param alpha:
-        :param beta:
-        :param maxdepth_v: depth limit
-        :return: value for minimax search
+        Packs the position into one int, see pack_position()
+        :return: int, or None if the queen has been captured
         """
-        if telemetry is not None:
-            telemetry.log(node)
+        if self.queen == 0:
+            return None
+        return pack_position(self.queen, self.dragons, self.wights, self.whoseTurn)
 
-        if maxdepth_v <= 0:
-            return node_v.heuristic()
+    def copy(self):
+        return DragonQueenBB((self.queen, self.dragons, self.wights), self.whoseTurn, self.countPlies, self.zobrist,
+                             self.score, self.mirror_zobrist)
 
-        successors = node_v.successors()
-        if len(successors) <= 0:
-            return node_v.utility()
-        elif node_v.isMaxNode():
-            if ab_prune:
-                value = -infinity
-                for state in successors:
-                    value = max(value, minimax_val_ab(state, alpha, beta, maxdepth_v - 1))
-                    if value >= beta:
-                        return value
-                    alpha = max(alpha, value)
-                return value
-            else:
-                vs = [minimax_val_ab(c, maxdepth_v=(maxdepth_v - 1)) for c in successors]
-                return max(vs)
-        elif node_v.isMinNode():
-            if ab_prune:
-                value = infinity
-                for state in successors:
-                    value = min(value, minimax_val_ab(state, alpha, beta, maxdepth_v - 1))
-                    if value <= alpha:
-                        return value
-                    beta = min(beta, value)
-                return value
+    def compute_zobrist(self, keys=ZOBRIST):
+        """
+        Computes the Zobrist key of the position from scratch; apply_move() updates it incrementally instead
+        :param keys: ZOBRIST, or ZOBRIST_MIRROR for the key of the mirror image
+        :return: 64-bit int
+        """
+        z = ZOBRIST_D_TO_MOVE if self.whoseTurn == 'D' else 0
+        for piece, mask in (('Q', self.queen), ('D', self.dragons), ('W', self.wights)):
+            for sq in bit_squares(mask):
+                z ^= keys[piece][sq]
+        return z
+
+    def canonical_zobrist(self):
+        """
+        Keys the position and its mirror image alike
+        :return: the smaller of the two Zobrist keys, True if that is the mirror image's
+        """
+        if self.mirror_zobrist < self.zobrist:
+            return self.mirror_zobrist, True
+        return self.zobrist, False
+
+    @property
+    def gameState(self):
+        """
+        Dict view of the board, for code written against DragonQueen.gameState
+        :return: dict mapping (r, c) to 'Q', 'D', 'W' or '.'
+        """
+        return {grid(sq): self.piece_at(sq) for sq in range(25)}
+
+    def piece_at(self, sq):
+        bit = 1 << sq
+        if self.wights & bit:
+            return 'W'
+        elif self.dragons & bit:
+            return 'D'
+        elif self.queen & bit:
+            return 'Q'
+        else:
+            return '.'
+
+    def isTerminal(self):
+        return self.queen == 0 or self.queen & ROW_5 != 0 or self.draw()
+
+    def legal_moves(self):
+        """
+        Generates the legal moves for the player to move from the precomputed neighbour tables
+        :return: list of (from, to, captured) tuples, where from and to are square numbers and captured
+            is the piece taken ('W', 'D' or 'Q') or None; empty if this is a terminal node
+        """
+        return list(self.iter_moves())
+
+    def iter_moves(self):
+        """
+        Yields the legal moves one at a time, in the same order as legal_moves()
+        :return: generator of (from, to, captured) tuples
+        """
+        if self.isTerminal():
+            return
+        if self.whoseTurn == 'D':
+            own = self.queen | self.dragons
+            wights = self.wights
+            for sq in bit_squares(own):
+                for to in KING_SQUARES[sq]:
+                    bit = BIT[to]
+                    if not bit & own:
+                        yield sq, to, 'W' if bit & wights else None
+        else:
+            wights = self.wights
+            occupied = self.queen | self.dragons | wights
+            for sq in bit_squares(wights):
+                for to, diagonal in WIGHT_SQUARES[sq]:
+                    bit = BIT[to]
+                    if diagonal:
+                        if bit & self.dragons:
+                            yield sq, to, 'D'
+                        elif bit & self.queen:
+                            yield sq, to, 'Q'
+                    elif not bit & occupied:
+                        yield sq, to, None
+
+    def capture_moves(self):
+        """
+        Generates only the capturing moves
+        :return: list of (from, to, captured) tuples, in the same order as legal_moves()
+        """
+        moves = list()
+        if self.isTerminal():
+            return moves
+        if self.whoseTurn == 'D':
+            for sq in bit_squares(self.queen | self.dragons):
+                for to in bit_squares(KING_MASKS[sq] & self.wights):
+                    moves.append((sq, to, 'W'))
+        else:
+            for sq in bit_squares(self.wights):
+                for to in bit_squares(DIAGONAL_MASKS[sq] & (self.queen | self.dragons)):
+                    moves.append((sq, to, 'Q' if BIT[to] & self.queen else 'D'))
+        return moves
+
+    def quiet_moves(self):
+        """
+        Generates only the non-capturing moves
+        :return: list of (from, to, None) tuples, in the same order as legal_moves()
+        """
+        moves = list()
+        if self.isTerminal():
+            return moves
+        empty = ~(self.queen | self.dragons | self.wights)
+        if self.whoseTurn == 'D':
+            pieces, targets = self.queen | self.dragons, KING_MASKS
+        else:
+            pieces, targets = self.wights, ORTHOGONAL_MASKS
+        for sq in bit_squares(pieces):
+            for to in bit_squares(targets[sq] & empty):
+                moves.append((sq, to, None))
+        return moves
+
+    def is_legal(self, move):
+        """
+        Checks a move, e.g. one remembered from another position, without generating the move list
+        :param move: (from, to, captured) tuple
+        :return: boolean
+        """
+        frm, to, captured = move
+        if self.isTerminal():
+            return False
+        to_bit = BIT[to]
+        if self.whoseTurn == 'D':
+            own = self.queen | self.dragons
+            if not own & BIT[frm] or own & to_bit or not KING_MASKS[frm] & to_bit:
+                return False
+            return captured == ('W' if self.wights & to_bit else None)
+        else:
+            if not self.wights & BIT[frm]:
+                return False
+            if DIAGONAL_MASKS[frm] & to_bit:
+                return captured is not None and self.piece_at(to) == captured
+            elif ORTHOGONAL_MASKS[frm] & to_bit:
+                return captured is None and self.piece_at(to) == '.'
+            return False
+
+    def apply_move(self, move):
+        """
+        Plays a move from legal_moves()
+        :param move: (from, to, captured) tuple
+        :return: DragonQueenBB object for the position after the move
+        """
+        queen, dragons, wights, z, mz, score = self._moved(move)
+        return DragonQueenBB((queen, dragons, wights), self.togglePlayer(self.whoseTurn), self.countPlies + 1, z,
+                             score, mz)
+
+    def make_move(self, move):
+        """
+        Plays a move from legal_moves() on this board in place; unmake_move() takes it back
+        :param move: (from, to, captured) tuple
+        :return: None
+        """
+        self.undo_stack.append((self.queen, self.dragons, self.wights, self.zobrist, self.mirror_zobrist, self.score))
+        self.queen, self.dragons, self.wights, self.zobrist, self.mirror_zobrist, self.score = self._moved(move)
+        self.whoseTurn = 'W' if self.whoseTurn == 'D' else 'D'
+        self.countPlies += 1
+
+    def unmake_move(self):
+        """
+        Takes back the last make_move()
+        :return: None
+        """
+        self.queen, self.dragons, self.wights, self.zobrist, self.mirror_zobrist, self.score = self.undo_stack.pop()
+        self.whoseTurn = 'W' if self.whoseTurn == 'D' else 'D'
+        self.countPlies -= 1
+
+    def _moved(self, move):
+        """
+        Incrementally updates the bitboards, Zobrist keys and heuristic score for a move
+        :param move: (from, to, captured) tuple
+        :return: queen, dragons, wights, zobrist, mirror image zobrist, score after the move
+        """
+        frm, to, captured = move
+        queen, dragons, wights, score = self.queen, self.dragons, self.wights, self.score
+        from_to = BIT[frm] | BIT[to]
+        if self.whoseTurn == 'D':
+            if queen & BIT[frm]:
+                queen = BIT[to]
+                piece = 'Q'
+                score += QUEEN_SCORE[to] - QUEEN_SCORE[frm]
             else:
-                vs = [minimax_val_ab(c, maxdepth_v=(maxdepth_v - 1)) for c in successors]
-                return min(vs)
+                dragons ^= from_to
+                piece = 'D'
+            if captured is not None:
+                wights ^= BIT[to]
+                score -= WIGHT_SCORE[to]
         else:
-            print("Something went horribly wrong")
-            exit(1)
+            wights ^= from_to
+            piece = 'W'
+            score += WIGHT_SCORE[to] - WIGHT_SCORE[frm]
+            if captured == 'D':
+                dragons ^= BIT[to]
+                score += 5
+            elif captured == 'Q':
+                queen = 0
+                score -= QUEEN_SCORE[to]
+        z = self.zobrist ^ ZOBRIST[piece][frm] ^ ZOBRIST[piece][to] ^ ZOBRIST_D_TO_MOVE
+        mz = self.mirror_zobrist ^ ZOBRIST_MIRROR[piece][frm] ^ ZOBRIST_MIRROR[piece][to] ^ ZOBRIST_D_TO_MOVE
+        if captured is not None:
+            z ^= ZOBRIST[captured][to]
+            mz ^= ZOBRIST_MIRROR[captured][to]
+        return queen, dragons, wights, z, mz, score
 
-    # Main body of minimax_ab starts here
-    choices = [(minimax_val_ab(c), c) for c in node.successors()]
-    
-    if len(choices) <= 0:
-        # No successors, this is a terminal node, return utility, None
-        # None indicates no possible moves
-        result = node.utility(), None
-    elif node.isMaxNode():
+    def heuristic(self):
+        """
+        Returns the estimate of utility for a non-terminal node, same scoring as DragonQueen.heuristic()
+        :return: float in the range -10.0 to +10.0
+        """
+        return self.score / 5.0
 
-        result = max(choices, key=lambda t: t[0])
-    elif node.isMinNode():
-        result = min(choices, key=lambda t: t[0])
-    else:
-        print("Something went horribly wrong")
-        result = None
-        exit(1)
-    return result
+    def compute_score(self):
+        """
+        Computes the heuristic score, scaled by 5, from scratch; moves update it incrementally instead
+        :return: int
+        """
+        h = -5 * popcount(self.dragons)
+        if self.queen:
+            h += QUEEN_SCORE[self.queen.bit_length() - 1]
+        for sq in bit_squares(self.wights):
+            h += WIGHT_SCORE[sq]
+        return h
 
+    def winFor(self, player):
+        """
+        Checks if the current board state in a win for the given player
+        :param player: 'D' or 'W'
+        :return: boolean
+        """
+        if player == 'D':
+            return self.queen & ROW_5 != 0
+        else:
+            return self.queen == 0
 
-def main():
-    game = DragonQueen(None)
-    path = list()
-    path.append(game)
+    def draw(self):
+        """
+        Checks for a draw state.
+        :return: boolean
+        """
+        if self.queen == 0 or self.queen & ROW_5:
+            return False
+        return self.countPlies >= 50 or self.wights == 0
 
-    print("Dragon Queen Game:")
-    game.display()
-    queen_computer = input("Dragon Queen: (t for computer, f for human) ").lower() == 't'
-    wight_computer = input("Wights: (t for computer, f for human) ").lower() == 't'
-    print("\n")
+    def move(self, fromgrid, togrid):
+        """
+        Evaluates one potential move on the game board
+        :param fromgrid: location of piece to move
+        :param togrid:  location to move the piece to
+        :return: (queen, dragons, wights) bitboards following the move or None if move is invalid
+        """
+        (r_from, c_from) = fromgrid
+        (r_to, c_to) = togrid
 
-    start = dt.datetime.utcnow()
-    while True:
-        cur = path[-1]
-        cur.display()
-        if cur.whoseTurn == 'W' and not wight_computer:
-            path.append(cur.get_move())
-        elif cur.whoseTurn == 'D' and not queen_computer:
-            path.append(cur.get_move())
-        elif cur.isTerminal():
-            break
+        if r_from < 1 or r_from > 5 or c_from < 1 or c_from > 5:
+            return None
+        if r_to < 1 or r_to > 5 or c_to < 1 or c_to > 5:
+            return None
+        if abs(r_from - r_to) > 1 or abs(c_from - c_to) > 1 or fromgrid == togrid:
+            return None
+
+        from_bit = 1 << square(r_from, c_from)
+        to_bit = 1 << square(r_to, c_to)
+        queen, dragons, wights = self.queen, self.dragons, self.wights
+
+        if self.whoseTurn == 'D':
+            # Dragons and the queen step one square in any direction onto an empty square or a wight
+            if to_bit & (queen | dragons):
+                return None
+            if queen & from_bit:
+                queen = to_bit
+            elif dragons & from_bit:
+                dragons ^= from_bit | to_bit
+            else:
+                return None
+            return queen, dragons, wights & ~to_bit
         else:
-            _, next_move = minimax_ab(cur, maxdepth=6, ab_prune=True)
+            if not wights & from_bit:
+                return None
+            diagonal = r_from != r_to and c_from != c_to
+            if to_bit & (queen | dragons):
+                # Capture -- diagonal only
+                if not diagonal:
+                    return None
+                queen &= ~to_bit
+                dragons &= ~to_bit
+            elif to_bit & wights or diagonal:
+                # Occupied by a friendly piece, or a diagonal step without a capture
+                return None
+            return queen, dragons, wights ^ (from_bit | to_bit)
+
+    def all_pieces(self, player):
+        """
+        Gets the locations of all pieces for a given player
+        :param player: the player
+        :return: List of board positions containing friendly pieces
+        """
+        if player == 'W':
+            return [grid(sq) for sq in bit_squares(self.wights)]
+        else:
+            return [grid(sq) for sq in bit_squares(self.queen | self.dragons)]
+
+    def queen_dist(self, pos):
+        """
+        Returns the Manhattan distance from the given board position to the queen piece
+        :param pos: reference board position
+        :return:
+        """
+        r, c = pos
+        q_r, q_c = grid(self.queen.bit_length() - 1)
+
+        return float(abs(q_r - r) + abs(q_c - c))
+
+
+# Transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """
+    Bounded transposition table keyed by Zobrist hash.
+    The table is a fixed array of slots indexed by the low bits of the key, so memory never grows past the
+    cap. Each slot holds one (key, depth, value, bound, best move, age) entry. Keys do not include the ply
+    count; minimax_ab mixes it in itself for positions close enough to the 50-ply draw for it to matter.
+    """
+    # Rough CPython footprint of one filled slot (entry tuple plus its int and move objects)
+    ENTRY_BYTES = 200
+
+    def __init__(self, max_entries=1 << 18, replacement='depth', max_mb=None):
+        """
+        :param max_entries: number of slots, rounded down to a power of two
+        :param replacement: 'depth' keeps the deeper entry unless it is left over from an earlier search,
+            'always' lets the newest entry win
+        :param max_mb: memory cap in megabytes, overrides max_entries
+        """
+        if replacement not in ('depth', 'always'):
+            raise Exception("Unknown replacement policy: " + str(replacement))
+        if max_mb is not None:
+            max_entries = int(max_mb * 2 ** 20) // self.ENTRY_BYTES
+        self.size = 1 << max(max_entries, 1).bit_length() - 1
+        self.mask = self.size - 1
+        self.replacement = replacement
+        self.slots = [None] * self.size
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """
+        Marks the start of a new search so that entries from earlier searches are replaced first
+        :return: None
+        """
+        self.age += 1
+
+    def probe(self, key):
+        """
+        Looks up a position
+        :param key: Zobrist key
+        :return: (key, depth, value, bound, move, age) entry or None
+        """
+        self.probes += 1
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        """
+        Records a search result, subject to the replacement policy
+        :param key: Zobrist key
+        :param depth: remaining depth the value was searched to
+        :param value: value found
+        :param bound: EXACT, LOWER or UPPER
+        :param move: best move found, or None
+        :return: None
+        """
+        i = key & self.mask
+        old = self.slots[i]
+        if old is not None:
+            if self.replacement == 'depth' and old[0] != key and old[5] == self.age and old[1] > depth:
+                return
+            if old[0] != key:
+                self.overwrites += 1
+        self.slots[i] = (key, depth, value, bound, move, self.age)
+        self.stores += 1
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def __str__(self):
+        return "TT: " + str(self.size) + " slots, " + str(self.probes) + " probes, " + str(self.hits) + \
+               " hits (" + str(round(100 * self.hit_rate(), 1)) + "%), " + str(self.stores) + " stores, " + \
+               str(self.overwrites) + " overwrites"
+
+
+class Tablebase:
+    """
+    Exact endgame results for reduced-material positions, as written by jin_DQTablebase.py.
+    The file holds every covered position that is won within 50 plies: a sorted array of packed positions
+    (see pack_position()) and the matching distances to win in plies, positive when Wights win and negative
+    when Dragons win. Of a position and its mirror image only the canonical one (see canonical_packed()) needs
+    to be stored. Covered positions that are not in the file are draws.
+    """
+    MAGIC = b'DQTB'
+    HEADER = struct.Struct('<4sBBBI')
+
+    def __init__(self, file_name):
+        """
+        :param file_name: tablebase file to load
+        """
+        with open(file_name, 'rb') as f:
+            magic, self.max_dragons, self.max_wights, self.max_pieces, count = self.HEADER.unpack(
+                f.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise Exception(file_name + " is not a DragonQueen tablebase")
+            self.keys = array('Q')
+            self.keys.fromfile(f, count)
+            self.distances = array('b')
+            self.distances.fromfile(f, count)
+        if sys.byteorder == 'big':
+            self.keys.byteswap()
+        # Longest win in the file, in plies
+        self.longest_win = max(map(abs, self.distances), default=0)
+        self.probes = 0
+        self.hits = 0
+
+    def covers(self, dragons, wights):
+        """
+        Checks if the tablebase holds positions with the given material (plus the queen)
+        :param dragons: number of dragons
+        :param wights: number of wights
+        :return: boolean
+        """
+        return dragons <= self.max_dragons and 0 < wights <= self.max_wights and dragons + wights <= self.max_pieces
+
+    def probe(self, node):
+        """
+        Looks up the exact result of a position, taking the 50-ply draw into account
+        :param node: DragonQueen or DragonQueenBB
+        :return: utility of the position under perfect play (+infinity Wights win, -infinity Dragons win,
+            0.0 draw), or None if the position is terminal or not covered
+        """
+        key = node.packed()
+        if key is None or node.countPlies >= 50:
+            return None
+        wights = key >> 30 & MASK_25
+        if not self.covers(popcount(key >> 5 & MASK_25), popcount(wights)) or key & 0b11111 >= 20:
+            return None
+        self.probes += 1
+        key = canonical_packed(key)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            distance = self.distances[i]
+            # The win only counts if it lands no later than the ply-50 draw
+            if node.countPlies + abs(distance) <= 50:
+                self.hits += 1
+                return float('inf') if distance > 0 else -float('inf')
+        return 0.0
+
+    @staticmethod
+    def load(file_name):
+        """
+        Loads a tablebase if the file exists
+        :param file_name: tablebase file
+        :return: Tablebase or None
+        """
+        if os.path.exists(file_name):
+            return Tablebase(file_name)
+        return None
+
+
+class OpeningBook:
+    """
+    Best replies for the positions near the fixed start position, as written by jin_DQBook.py.
+    The file holds a sorted array of packed positions (see pack_position()) and the matching moves, each
+    stored as from_square * 25 + to_square. Mirror images share the entry of the canonical position (see
+    canonical_packed()), whose move is reflected to play it in the other one.
+    """
+    MAGIC = b'DQOB'
+    HEADER = struct.Struct('<4sBBI')
+
+    def __init__(self, file_name):
+        """
+        :param file_name: opening book file to load
+        """
+        with open(file_name, 'rb') as f:
+            magic, self.plies, self.depth, count = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise Exception(file_name + " is not a DragonQueen opening book")
+            self.keys = array('Q')
+            self.keys.fromfile(f, count)
+            self.moves = array('H')
+            self.moves.fromfile(f, count)
+        if sys.byteorder == 'big':
+            self.keys.byteswap()
+            self.moves.byteswap()
+        self.probes = 0
+        self.hits = 0
+
+    @staticmethod
+    def encode_move(move):
+        """
+        Packs the from and to squares of a move into one int
+        :param move: (from, to, captured) tuple with square numbers or board positions
+        :return: int below 625
+        """
+        fromsq, tosq = move[0], move[1]
+        if isinstance(fromsq, tuple):
+            fromsq, tosq = square(*fromsq), square(*tosq)
+        return fromsq * 25 + tosq
+
+    def probe(self, node):
+        """
+        Looks up the book move for a position
+        :param node: DragonQueen or DragonQueenBB
+        :return: the game state after the book move, or None if the position is not in the book
+        """
+        if node.countPlies > self.plies:
+            return None
+        key = node.packed()
+        if key is None:
+            return None
+        self.probes += 1
+        canonical = canonical_packed(key)
+        i = bisect_left(self.keys, canonical)
+        if i < len(self.keys) and self.keys[i] == canonical:
+            code = self.moves[i]
+            if canonical != key:
+                code = MIRROR_SQUARES[code // 25] * 25 + MIRROR_SQUARES[code % 25]
+            for m in node.legal_moves():
+                if self.encode_move(m) == code:
+                    self.hits += 1
+                    return node.apply_move(m)
+        return None
+
+    @staticmethod
+    def load(file_name):
+        """
+        Loads an opening book if the file exists
+        :param file_name: opening book file
+        :return: OpeningBook or None
+        """
+        if os.path.exists(file_name):
+            return OpeningBook(file_name)
+        return None
+
+
+class GameRecord:
+    """
+    A game stored as its start position and one byte per move, from_square * 8 + direction, so a whole game
+    takes a few dozen bytes and positions are only rebuilt when it is replayed
+    """
+    # Steps (dr, dc) in the order of the direction codes
+    DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+    # Game id, whether the game starts from the standard start position, number of moves
+    HEADER = struct.Struct('<IBB')
+    # Packed position and ply number of any other start position
+    START = struct.Struct('<QB')
+
+    def __init__(self, start=None, game_id=0):
+        """
+        :param start: DragonQueen or DragonQueenBB the game starts from, None for the standard start
+        :param game_id: number to tell the games in a file apart, e.g. a run number
+        """
+        self.start = start
+        self.game_id = game_id
+        self.moves = bytearray()
+
+    @staticmethod
+    def encode_move(move):
+        """
+        :param move: (from, to, captured) tuple with square numbers or board positions
+        :return: int below 200
+        """
+        fromsq, tosq = move[0], move[1]
+        if isinstance(fromsq, tuple):
+            fromsq, tosq = square(*fromsq), square(*tosq)
+        return fromsq * 8 + GameRecord.DIRECTIONS.index((tosq // 5 - fromsq // 5, tosq % 5 - fromsq % 5))
+
+    def append(self, move):
+        """
+        Adds the next move of the game
+        :param move: (from, to, captured) tuple
+        :return: None
+        """
+        self.moves.append(self.encode_move(move))
+
+    def append_state(self, node, next_node):
+        """
+        Adds the move that leads from one position to the next, for callers that only see positions
+        :param node: position before the move
+        :param next_node: position after it
+        :return: None
+        """
+        board = str(next_node)
+        for m in node.legal_moves():
+            if str(node.apply_move(m)) == board:
+                self.append(m)
+                return
+        raise Exception("No legal move leads from " + str(node) + " to " + board)
+
+    def positions(self):
+        """
+        Replays the game
+        :return: generator of DragonQueenBB objects, the start position first
+        """
+        if self.start is None:
+            node = DragonQueenBB(None)
+        else:
+            node = DragonQueenBB(unpack_position(self.start.packed())[:3], self.start.whoseTurn,
+                                 self.start.countPlies)
+        yield node
+        for code in self.moves:
+            fromsq = code >> 3
+            dr, dc = self.DIRECTIONS[code & 7]
+            tosq = fromsq + 5 * dr + dc
+            target = node.piece_at(tosq)
+            node = node.apply_move((fromsq, tosq, target if target != '.' else None))
+            yield node
+
+    def last(self):
+        """
+        :return: DragonQueenBB of the final position
+        """
+        node = None
+        for node in self.positions():
+            pass
+        return node
+
+    def to_bytes(self):
+        s = self.HEADER.pack(self.game_id, self.start is None, len(self.moves))
+        if self.start is not None:
+            s += self.START.pack(self.start.packed(), self.start.countPlies)
+        return s + bytes(self.moves)
+
+    @staticmethod
+    def read(f):
+        """
+        Reads the next game from a file
+        :param f: binary file object
+        :return: GameRecord, or None at the end of the file or at a last record cut off part way through
+        """
+        header = f.read(GameRecord.HEADER.size)
+        if len(header) < GameRecord.HEADER.size:
+            return None
+        game_id, standard, num_moves = GameRecord.HEADER.unpack(header)
+        record = GameRecord(None, game_id)
+        if not standard:
+            start = f.read(GameRecord.START.size)
+            if len(start) < GameRecord.START.size:
+                return None
+            key, countplies = GameRecord.START.unpack(start)
+            queen, dragons, wights, player = unpack_position(key)
+            record.start = DragonQueenBB((queen, dragons, wights), player, countplies)
+        record.moves = bytearray(f.read(num_moves))
+        if len(record.moves) < num_moves:
+            return None
+        return record
+
+
+class GameRecordWriter:
+    """
+    Appends GameRecords to a file as they come in, so nothing but the current game has to be kept in memory
+    """
+    MAGIC = b'DQGR'
+
+    def __init__(self, file_name, append=True):
+        """
+        :param file_name: game file, created if it does not exist
+        :param append: add to the games already in the file; if False the file is started afresh
+        """
+        new = not append or not os.path.exists(file_name) or os.path.getsize(file_name) == 0
+        self.f = open(file_name, 'ab' if append else 'wb')
+        if new:
+            self.f.write(self.MAGIC)
+
+    def write(self, record):
+        """
+        :param record: GameRecord
+        :return: None
+        """
+        self.f.write(record.to_bytes())
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def read_game_records(file_name):
+    """
+    Streams the games back from a file written by GameRecordWriter
+    :param file_name: game file
+    :return: generator of GameRecord objects
+    """
+    with open(file_name, 'rb') as f:
+        if f.read(len(GameRecordWriter.MAGIC)) != GameRecordWriter.MAGIC:
+            raise Exception(file_name + " is not a DragonQueen game file")
+        while True:
+            record = GameRecord.read(f)
+            if record is None:
+                return
+            yield record
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchBudget:
+    """
+    Wall-clock and/or node budget for a search. tick() is called once per node and raises SearchTimeout
+    when the budget is spent or stop() has been called.
+    """
+    def __init__(self, seconds=None, nodes=None):
+        """
+        :param seconds: wall-clock limit, or None
+        :param nodes: node limit, or None
+        """
+        self.deadline = None if seconds is None else time.time() + seconds
+        self.max_nodes = nodes
+        self.nodes = 0
+        self.stopped = False
+
+    def stop(self):
+        """
+        Ends the search at its next node, e.g. from another thread
+        :return: None
+        """
+        self.stopped = True
+
+    def tick(self):
+        self.nodes += 1
+        if self.stopped:
+            raise SearchTimeout()
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchTimeout()
+        # Reading the clock costs about as much as visiting a node, so only look every 256 nodes
+        if self.deadline is not None and self.nodes & 255 == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+
+
+class MoveOrdering:
+    """
+    Orders moves for alpha-beta search: the transposition table move first, then captures, then killer
+    moves for the ply, then the rest by history score. Keep one object across a game or an iterative
+    deepening run so killers and history carry over between searches.
+    """
+    # Captures sort by victim, the queen first
+    CAPTURE_RANK = {'Q': 0, 'D': 1, 'W': 1}
+
+    def __init__(self, num_killers=2):
+        """
+        :param num_killers: killer moves remembered per ply
+        """
+        self.num_killers = num_killers
+        self.killers = dict()   # ply -> list of quiet moves that caused a cutoff, most recent first
+        self.history = dict()   # (player, from, to) -> score
+
+    def new_search(self):
+        """
+        Ages the history table so that old cutoffs count for less than recent ones
+        :return: None
+        """
+        for k in self.history:
+            self.history[k] //= 2
+
+    def order(self, moves, node, tt_move=None):
+        """
+        Sorts moves from node.legal_moves() best-first
+        :param moves: list of (from, to, captured) tuples
+        :param node: the position the moves are played from
+        :param tt_move: move to search first, e.g. from the transposition table, or None
+        :return: new list of moves
+        """
+        killers = self.killers.get(node.countPlies, ())
+        history = self.history
+        turn = node.whoseTurn
+
+        def rank(m):
+            if m == tt_move:
+                return 0, 0
+            elif m[2] is not None:
+                return 1, self.CAPTURE_RANK[m[2]]
+            elif m in killers:
+                return 2, killers.index(m)
+            else:
+                return 3, -history.get((turn, m[0], m[1]), 0)
+
+        # sorted() is stable, so equally ranked moves keep their generation order
+        return sorted(moves, key=rank)
+
+    def moves(self, node, tt_move=None):
+        """
+        Yields the moves of node in the same order as order(), but in stages -- transposition table move,
+        captures, killers, remaining quiet moves -- so that the later stages are never generated when an
+        earlier move causes a cutoff. Nodes without capture_moves() are ordered in one go.
+        :param node: the position to generate moves for
+        :param tt_move: move to search first, e.g. from the transposition table, or None
+        :return: generator of (from, to, captured) tuples
+        """
+        if not hasattr(node, 'capture_moves'):
+            for m in self.order(node.legal_moves(), node, tt_move):
+                yield m
+            return
+
+        if tt_move is not None and node.is_legal(tt_move):
+            yield tt_move
+        else:
+            tt_move = None
+        for m in sorted(node.capture_moves(), key=lambda c: self.CAPTURE_RANK[c[2]]):
+            if m != tt_move:
+                yield m
+
+        killers = [m for m in self.killers.get(node.countPlies, ()) if m != tt_move and node.is_legal(m)]
+        for m in killers:
+            yield m
+
+        history = self.history
+        turn = node.whoseTurn
+        quiets = [m for m in node.quiet_moves() if m != tt_move and m not in killers]
+        for m in sorted(quiets, key=lambda q: -history.get((turn, q[0], q[1]), 0)):
+            yield m
+
+    def cutoff(self, move, node, depth):
+        """
+        Records a move that caused a beta cutoff
+        :param move: the move
+        :param node: the position it was played from
+        :param depth: remaining search depth at node
+        :return: None
+        """
+        if move[2] is not None:
+            # Captures are already tried early
+            return
+        killers = self.killers.setdefault(node.countPlies, [])
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.num_killers:]
+        k = (node.whoseTurn, move[0], move[1])
+        self.history[k] = self.history.get(k, 0) + depth * depth
+
+
+class SearchStats:
+    """
+    Counters collected by minimax_ab as it searches; they are plain integer updates, cheap enough to leave on.
+    A beta cutoff on the first move tried at a node means the move ordering put the best move first; with good
+    ordering the first-move cutoff rate is above 90%.
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # Nodes visited at each distance from the search root; index 1 counts the root's children
+        self.depth_nodes = [0]
+        # Nodes whose moves were searched, the moves searched at them in total and at most at one node
+        self.expanded = 0
+        self.children = 0
+        self.max_children = 0
+        self.tt_hits = 0
+        self.tablebase_hits = 0
+        # (depth, nodes, seconds) of each minimax_ab call, e.g. each iterative deepening iteration
+        self.iterations = list()
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def branching_factor(self):
+        """
+        :return: average number of moves searched at a node that was not cut off before its moves
+        """
+        return self.children / self.expanded if self.expanded else 0.0
+
+    def max_depth(self):
+        """
+        :return: deepest distance from the search root reached
+        """
+        return len(self.depth_nodes) - 1
+
+    def completed_depth(self):
+        """
+        :return: deepest iteration that ran to completion, 0 if none
+        """
+        return max((depth for depth, _, _ in self.iterations), default=0)
+
+    def merge(self, other):
+        """
+        Adds the counters of another SearchStats, e.g. from a worker process
+        :param other: SearchStats
+        :return: None
+        """
+        self.nodes += other.nodes
+        self.cutoffs += other.cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+        if len(other.depth_nodes) > len(self.depth_nodes):
+            self.depth_nodes.extend([0] * (len(other.depth_nodes) - len(self.depth_nodes)))
+        for ply, n in enumerate(other.depth_nodes):
+            self.depth_nodes[ply] += n
+        self.expanded += other.expanded
+        self.children += other.children
+        self.max_children = max(self.max_children, other.max_children)
+        self.tt_hits += other.tt_hits
+        self.tablebase_hits += other.tablebase_hits
+        self.iterations.extend(other.iterations)
+
+    def __str__(self):
+        s = "Nodes: " + str(self.nodes) + ", cutoffs: " + str(self.cutoffs) + ", first-move cutoffs: " + \
+            str(self.first_move_cutoffs) + " (" + str(round(100 * self.first_move_cutoff_rate(), 1)) + "%)"
+        s += "\nBranching factor: " + str(round(self.branching_factor(), 2)) + ", max. moves at a node: " + \
+            str(self.max_children) + ", TT hits: " + str(self.tt_hits) + ", tablebase hits: " + \
+            str(self.tablebase_hits)
+        s += "\nNodes per depth: " + str(self.depth_nodes[1:])
+        for depth, nodes, seconds in self.iterations:
+            s += "\nDepth " + str(depth) + ": " + str(nodes) + " nodes in " + str(round(seconds, 3)) + " s"
+        return s
+
+
+def minimax_ab(node, maxdepth=1, ab_prune=True, telemetry=None, tt=None, budget=None, ordering=None,
+               stats=None, inplace=True, alpha=-float('inf'), beta=float('inf'), tablebase=None, engine='ab',
+               quiescence=False):
+    """
+    minimax search with specified depth limit and optional alpha-beta pruning
+    :param node:  a Game object responding to the following methods:
+        str(): return a unique string describing the state of the game
+            (for use in hash table)
+        successors(): returns a list of all legal game states that extend
+            this one by one move
+        isMinNode(): returns True if the node represents a state in which
+            Min is to move
+        isMaxNode(): returns True if the node represents a state in which
+            Max is to move
+        utility(): returns the utility of a terminal node
+        heuristic(): estimates the utility of an non-terminal node
+      Nodes that also have legal_moves(), iter_moves() and apply_move() are searched move by move, generating
+      moves and children only as they are visited; nodes with make_move()/unmake_move() are searched on a
+      single board that is updated in place; nodes with a zobrist key can use a transposition table. Other
+      nodes are expanded through iter_successors() if they have it.
+    :param maxdepth: cutoff depth for search
+    :param ab_prune: use alpha-beta pruning
+    :param telemetry: a telemetry object with a stats attribute, the SearchStats to count into when stats
+        is not given
+    :param tt: TranspositionTable shared between searches, used with alpha-beta pruning on nodes
+        with a zobrist key; nodes with canonical_zobrist() share entries with their mirror image
+    :param budget: SearchBudget; SearchTimeout is raised out of the search when it runs out
+    :param ordering: MoveOrdering for nodes with legal_moves(); without it moves are searched in generation
+        order, transposition table move first
+    :param stats: SearchStats to count nodes, cutoffs, table hits, the moves searched per node and the
+        time of the search into
+    :param inplace: search nodes with make_move() on one board instead of building a child per move
+    :param alpha: lower end of the root search window; a value <= alpha is only an upper bound
+    :param beta: upper end of the root search window; a value >= beta is only a lower bound
+    :param tablebase: Tablebase probed at every node; covered positions get their exact value
+        without further search
+    :param engine: 'ab' for plain alpha-beta, or 'pvs' for principal variation search: with pruning, every
+        move after the first is searched with a null window around the best value so far, and only searched
+        again with the full window if it turns out better
+    :param quiescence: with pruning, search captures past the depth limit until the position is quiet,
+        instead of taking the heuristic of a position where a piece is about to be taken. The side to move
+        may also stand pat on the heuristic, so only captures that improve on it are followed.
+    :return: the value of the game state, the game state
+    """
+    infinity = float('inf')
+    if engine not in ('ab', 'pvs'):
+        raise Exception("Unknown engine: " + str(engine))
+    if stats is None and telemetry is not None:
+        stats = telemetry.stats
+    if stats is not None:
+        start_time, start_nodes = time.time(), stats.nodes
+    pvs = ab_prune and engine == 'pvs'
+    if not ab_prune or not hasattr(node, 'zobrist'):
+        tt = None
+    if tt is not None:
+        tt.new_search()
+    if not hasattr(node, 'legal_moves'):
+        ordering = None
+    if not hasattr(node, 'packed'):
+        tablebase = None
+    if not ab_prune or not hasattr(node, 'legal_moves'):
+        quiescence = False
+    if ordering is not None:
+        ordering.new_search()
+
+    # A move is either a legal_moves() tuple or, for nodes that only offer successors(), the child itself.
+    # expand() yields the moves of a node lazily, first (e.g. the transposition table move) at the front when
+    # it is legal, so an alpha-beta cutoff leaves the rest ungenerated. play() returns the position after
+    # the move and undo() takes it back again, which is only needed when the search runs in place.
+    if ordering is not None:
+        def expand(n, first):
+            return ordering.moves(n, first)
+    elif hasattr(node, 'legal_moves'):
+        def expand(n, first):
+            if first is not None and hasattr(n, 'is_legal') and n.is_legal(first):
+                return itertools.chain((first,), (m for m in n.iter_moves() if m != first))
+            return n.iter_moves()
+    elif hasattr(node, 'iter_successors'):
+        def expand(n, first):
+            return n.iter_successors()
+    else:
+        def expand(n, first):
+            return n.successors()
+
+    if inplace and hasattr(node, 'make_move'):
+        def play(n, m):
+            n.make_move(m)
+            return n
+
+        def undo(n):
+            n.unmake_move()
+    elif hasattr(node, 'legal_moves'):
+        def play(n, m):
+            return n.apply_move(m)
+
+        def undo(n):
+            pass
+    else:
+        def play(n, m):
+            return m
+
+        def undo(n):
+            pass
+
+    # The value of a position searched depth plies deep depends on the ply count once the search can reach
+    # the 50-ply draw, or a tablebase win that would land after it; quiescence can go one ply further per piece
+    # captured. Such positions are stored under a key that includes the ply, so their values are never used at
+    # another ply. Further from the draw the same position at any ply shares one entry, and such an entry can
+    # only cut the search off if it was searched no deeper than the draw allows at this ply (see tt_usable);
+    # otherwise it only supplies its move.
+    horizon = 50
+    if tablebase is not None:
+        horizon -= max(tablebase.longest_win - 1, 0)
+    if quiescence:
+        horizon -= 9
+
+    def ply_key(n, key, depth):
+        return key ^ ZOBRIST_PLY[n.countPlies] if n.countPlies + depth >= horizon else key
+
+    def tt_usable(n, entry_depth, depth):
+        # Under the plain key the stored search may have gone past the draw as seen from this ply
+        return entry_depth >= depth and (n.countPlies + depth >= horizon or n.countPlies + entry_depth < horizon)
+
+    # Nodes with canonical_zobrist() share one table entry with their mirror image. The entry holds the move
+    # for the canonical orientation, so it is reflected on the way in and out for the other one.
+    if hasattr(node, 'canonical_zobrist'):
+        def tt_probe(n, depth):
+            key, mirrored = n.canonical_zobrist()
+            entry = tt.probe(ply_key(n, key, depth))
+            if entry is None:
+                return None, None
+            return entry, mirror_move(entry[4]) if mirrored and entry[4] is not None else entry[4]
+
+        def tt_store(n, depth, value, bound, move):
+            key, mirrored = n.canonical_zobrist()
+            tt.store(ply_key(n, key, depth), depth, value, bound,
+                     mirror_move(move) if mirrored and move is not None else move)
+    else:
+        def tt_probe(n, depth):
+            entry = tt.probe(ply_key(n, n.zobrist, depth))
+            return entry, entry[4] if entry is not None else None
+
+        def tt_store(n, depth, value, bound, move):
+            tt.store(ply_key(n, n.zobrist, depth), depth, value, bound, move)
+
+    def expanded(searched):
+        stats.expanded += 1
+        stats.children += searched
+        if searched > stats.max_children:
+            stats.max_children = searched
+
+    def cutoff(node_v, move, index, depth):
+        if stats is not None:
+            stats.cutoffs += 1
+            if index == 0:
+                stats.first_move_cutoffs += 1
+        if ordering is not None:
+            ordering.cutoff(move, node_v, depth)
+
+    def search_child(n, i, alpha, beta, maxdepth_v, maximize):
+        # Plain alpha-beta searches every child with the full window. PVS assumes the first move is the best
+        # one and only proves the others worse with a null window, a much cheaper search; one that fails
+        # the wrong way is searched again with the full window for its exact value. Until the best value so
+        # far is finite there is nothing to put a null window around, and a child at the depth limit is only
+        # scored, so the probe would just score it twice.
+        if not pvs or i == 0 or maxdepth_v <= 0 or (alpha == -infinity if maximize else beta == infinity):
+            return minimax_val_ab(n, alpha, beta, maxdepth_v)
+        if maximize:
+            v = minimax_val_ab(n, alpha, alpha + _HALF_SCORE_STEP, maxdepth_v)
+        else:
+            v = minimax_val_ab(n, beta - _HALF_SCORE_STEP, beta, maxdepth_v)
+        if alpha < v < beta:
+            v = minimax_val_ab(n, alpha, beta, maxdepth_v)
+        return v
+
+    def captures(n):
+        moves = n.capture_moves() if hasattr(n, 'capture_moves') else [m for m in n.iter_moves() if m[2] is not None]
+        return sorted(moves, key=lambda c: MoveOrdering.CAPTURE_RANK[c[2]])
+
+    def quiesce(node_v, alpha, beta, maxdepth_v):
+        """
+        Capture-only search past the depth limit
+        :param node_v: node at or below the depth limit
+        :param alpha:
+        :param beta:
+        :param maxdepth_v: depth limit, 0 or less; counts down further for the statistics
+        :return: value for minimax search
+        """
+        if budget is not None:
+            budget.tick()
+        if stats is not None:
+            stats.nodes += 1
+            ply = maxdepth - maxdepth_v
+            if ply >= len(stats.depth_nodes):
+                stats.depth_nodes.extend([0] * (ply + 1 - len(stats.depth_nodes)))
+            stats.depth_nodes[ply] += 1
+
+        if tablebase is not None:
+            value = tablebase.probe(node_v)
+            if value is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return value
+        if node_v.isTerminal():
+            return node_v.utility()
+
+        # Stand pat: the side to move can decline every capture and keep the heuristic value
+        value = node_v.heuristic()
+        maximize = node_v.isMaxNode()
+        if (maximize and value >= beta) or (not maximize and value <= alpha):
+            return value
+        for i, m in enumerate(captures(node_v)):
+            if maximize:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            v = quiesce(play(node_v, m), alpha, beta, maxdepth_v - 1)
+            undo(node_v)
+            if (maximize and v > value) or (not maximize and v < value):
+                value = v
+            if (maximize and value >= beta) or (not maximize and value <= alpha):
+                cutoff(node_v, m, i, 0)
+                break
+        return value
+
+    def minimax_val_ab(node_v, alpha=-infinity, beta=infinity, maxdepth_v=(maxdepth-1)):
+        """
+        :param node_v: the root node for search
+        :param alpha:
+        :param beta:
+        :param maxdepth_v: depth limit
+        :return: value for minimax search
+        """
+        if budget is not None:
+            budget.tick()
+        if stats is not None:
+            stats.nodes += 1
+            ply = maxdepth - maxdepth_v
+            if ply >= len(stats.depth_nodes):
+                stats.depth_nodes.extend([0] * (ply + 1 - len(stats.depth_nodes)))
+            stats.depth_nodes[ply] += 1
+
+        if tablebase is not None:
+            value = tablebase.probe(node_v)
+            if value is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return value
+
+        if maxdepth_v <= 0:
+            if quiescence:
+                return quiesce(node_v, alpha, beta, maxdepth_v)
+            return node_v.heuristic()
+
+        tt_move = None
+        if tt is not None:
+            entry, tt_move = tt_probe(node_v, maxdepth_v)
+            if entry is not None:
+                if stats is not None:
+                    stats.tt_hits += 1
+                _, depth, value, bound, _, _ = entry
+                if tt_usable(node_v, depth, maxdepth_v):
+                    if bound == EXACT:
+                        return value
+                    elif bound == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return value
+
+        moves = expand(node_v, tt_move)
+
+        if not ab_prune:
+            vs = list()
+            for m in moves:
+                vs.append(minimax_val_ab(play(node_v, m), maxdepth_v=(maxdepth_v - 1)))
+                undo(node_v)
+            if stats is not None and len(vs) > 0:
+                expanded(len(vs))
+            if len(vs) <= 0:
+                return node_v.utility()
+            elif node_v.isMaxNode():
+                return max(vs)
+            elif node_v.isMinNode():
+                return min(vs)
+            else:
+                print("Something went horribly wrong")
+                exit(1)
+
+        alpha_start, beta_start = alpha, beta
+        best_move = None
+        if node_v.isMaxNode():
+            value = -infinity
+            for i, m in enumerate(moves):
+                v = search_child(play(node_v, m), i, alpha, beta, maxdepth_v - 1, True)
+                undo(node_v)
+                if best_move is None or v > value:
+                    value, best_move = v, m
+                if value >= beta:
+                    cutoff(node_v, best_move, i, maxdepth_v)
+                    break
+                alpha = max(alpha, value)
+        elif node_v.isMinNode():
+            value = infinity
+            for i, m in enumerate(moves):
+                v = search_child(play(node_v, m), i, alpha, beta, maxdepth_v - 1, False)
+                undo(node_v)
+                if best_move is None or v < value:
+                    value, best_move = v, m
+                if value <= alpha:
+                    cutoff(node_v, best_move, i, maxdepth_v)
+                    break
+                beta = min(beta, value)
+        else:
+            print("Something went horribly wrong")
+            exit(1)
+
+        if best_move is None:
+            # No successors, terminal node
+            return node_v.utility()
+        if stats is not None:
+            expanded(i + 1)
+        if tt is not None:
+            if value <= alpha_start:
+                bound = UPPER
+            elif value >= beta_start:
+                bound = LOWER
+            else:
+                bound = EXACT
+            tt_store(node_v, maxdepth_v, value, bound, best_move)
+        return value
+
+    # Main body of minimax_ab starts here
+    root_move = None
+    if tt is not None:
+        # The best move of the last search of this position, e.g. the previous iterative deepening pass
+        _, root_move = tt_probe(node, maxdepth - 1)
+    board = node.copy() if inplace and hasattr(node, 'make_move') else node
+    alpha_start, beta_start = alpha, beta
+    value, move = None, None
+    # The first of equally good moves is kept, so narrowing the window after each move cannot change the choice
+    for i, m in enumerate(expand(node, root_move)):
+        v = search_child(play(board, m), i, alpha, beta, maxdepth - 1, node.isMaxNode())
+        undo(board)
+        if node.isMaxNode():
+            if move is None or v > value:
+                value, move = v, m
+            if ab_prune:
+                if value >= beta:
+                    break
+                alpha = max(alpha, value)
+        elif node.isMinNode():
+            if move is None or v < value:
+                value, move = v, m
+            if ab_prune:
+                if value <= alpha:
+                    break
+                beta = min(beta, value)
+        else:
+            print("Something went horribly wrong")
+            exit(1)
+
+    if stats is not None:
+        if move is not None:
+            expanded(i + 1)
+        stats.iterations.append((maxdepth, stats.nodes - start_nodes, time.time() - start_time))
+    if move is None:
+        # No successors, this is a terminal node, return utility, None
+        # None indicates no possible moves
+        return node.utility(), None
+    if tt is not None:
+        if value <= alpha_start:
+            bound = UPPER
+        elif value >= beta_start:
+            bound = LOWER
+        else:
+            bound = EXACT
+        tt_store(node, maxdepth, value, bound, move)
+    if hasattr(node, 'legal_moves'):
+        return value, node.apply_move(move)
+    return value, move
+
+
+def iterative_deepening(node, seconds=None, nodes=None, maxdepth=50, ab_prune=True, telemetry=None, tt=None,
+                        ordering=None, stats=None, tablebase=None, engine='ab', aspiration=None, quiescence=False,
+                        budget=None):
+    """
+    Runs minimax_ab at depth 1, 2, 3, ... until the time or node budget runs out
+    :param node: a Game object, as for minimax_ab
+    :param seconds: wall-clock budget for the whole search, or None
+    :param nodes: node budget for the whole search, or None
+    :param maxdepth: deepest iteration to run
+    :param ab_prune: use alpha-beta pruning
+    :param telemetry: a telemetry object, as for minimax_ab
+    :param tt: TranspositionTable; a new one is used if None. Each iteration starts from the best move
+        the previous one stored for the root.
+    :param ordering: MoveOrdering; a new one is used if None
+    :param stats: SearchStats to count nodes and cutoffs into
+    :param tablebase: Tablebase, as for minimax_ab
+    :param engine: 'ab' or 'pvs', as for minimax_ab
+    :param quiescence: search captures past the depth limit, as for minimax_ab
+    :param budget: SearchBudget to use instead of one made from seconds and nodes, e.g. to stop the search
+        from another thread
+    :param aspiration: with pruning, search each iteration after the first in a window this far either side
+        of the previous value, and again with that side opened up if the value falls outside it; None
+        always searches the full window
+    :return: the value of the game state, the game state, both from the deepest completed iteration
+    """
+    if tt is None:
+        tt = TranspositionTable()
+    if ordering is None:
+        ordering = MoveOrdering()
+    if budget is None:
+        budget = SearchBudget(seconds, nodes)
+    # Searching past the 50-ply draw cannot change the result
+    maxdepth = max(1, min(maxdepth, 51 - node.countPlies))
+    infinity = float('inf')
+    result = None
+    for depth in range(1, maxdepth + 1):
+        alpha, beta = -infinity, infinity
+        if ab_prune and aspiration is not None and result is not None:
+            alpha, beta = result[0] - aspiration, result[0] + aspiration
+        try:
+            while True:
+                value, state = minimax_ab(node, maxdepth=depth, ab_prune=ab_prune, telemetry=telemetry, tt=tt,
+                                          budget=budget, ordering=ordering, stats=stats, alpha=alpha, beta=beta,
+                                          tablebase=tablebase, engine=engine, quiescence=quiescence)
+                # Outside the window the value is only a bound and the move may not be the best one
+                if alpha > -infinity and value <= alpha:
+                    alpha = -infinity
+                elif beta < infinity and value >= beta:
+                    beta = infinity
+                else:
+                    break
+        except SearchTimeout:
+            break
+        result = value, state
+        if result[1] is None or abs(result[0]) == float('inf'):
+            # Terminal node or forced result, deeper iterations will not change the move
+            break
+
+    if result is None:
+        # Not even depth 1 fit in the budget, fall back to it anyway
+        result = minimax_ab(node, maxdepth=1, ab_prune=ab_prune, telemetry=telemetry, tt=tt, ordering=ordering,
+                            stats=stats, tablebase=tablebase, engine=engine, quiescence=quiescence)
+    return result
+
+
+class Ponder:
+    """
+    Searches a position in a background thread while the player to move thinks about it. The search fills
+    the shared transposition table and move ordering, so the search after the reply starts from the results
+    for every reply already looked at, best replies first and deepest. After the reply, a search to depth()
+    only has one ply more to do than the table already holds for it, which is quick.
+    """
+    def __init__(self, node, tt, ordering, tablebase=None):
+        """
+        Starts pondering
+        :param node: position with the opponent to move
+        :param tt: TranspositionTable the next search will use
+        :param ordering: MoveOrdering the next search will use
+        :param tablebase: Tablebase, or None
+        """
+        self.budget = SearchBudget()
+        self.stats = SearchStats()
+        self.thread = threading.Thread(target=iterative_deepening, args=(node,), daemon=True,
+                                       kwargs={'tt': tt, 'ordering': ordering, 'tablebase': tablebase,
+                                               'stats': self.stats, 'budget': self.budget})
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops pondering and waits for the search to leave the shared tables alone
+        :return: None
+        """
+        self.budget.stop()
+        self.thread.join()
+
+    def depth(self):
+        """
+        :return: deepest iteration the pondering search completed, 0 if none
+        """
+        return self.stats.completed_depth()
+
+
+# Default location of the endgame tablebase written by jin_DQTablebase.py
+TABLEBASE_FILE = "dq_tablebase.bin"
+
+# Default location of the opening book written by jin_DQBook.py
+BOOK_FILE = "dq_book.bin"
+
+# Heuristic values are multiples of 1/5, so a window widened by half that can never split two scores, and a
+# window this wide holds no score strictly inside it
+_HALF_SCORE_STEP = 0.1
+
+# Per-process state of parallel_minimax_ab workers
+_worker_bound = None
+_worker_ordering = None
+
+
+def _init_parallel_worker(bound):
+    global _worker_bound, _worker_ordering
+    _worker_bound = bound
+    _worker_ordering = MoveOrdering()
+
+
+def _search_root_child(child, depth, maximize, ab_prune):
+    """
+    Searches one root child in a parallel_minimax_ab worker
+    :param child: position after the root move
+    :param depth: remaining depth below the child
+    :param maximize: True if the root player is Max
+    :param ab_prune: use alpha-beta pruning
+    :return: value of the child, SearchStats of the search below it counted from the root
+    """
+    infinity = float('inf')
+    alpha, beta = -infinity, infinity
+    if ab_prune:
+        # Only a child that can at least tie the best value found so far needs an exact value. The window is
+        # widened by half a score step so that ties are always searched exactly, which keeps the chosen move
+        # independent of the order in which workers finish.
+        best = _worker_bound.value
+        if maximize and best > -infinity:
+            alpha = best - _HALF_SCORE_STEP if best < infinity else 1e9
+        elif not maximize and best < infinity:
+            beta = best + _HALF_SCORE_STEP if best > -infinity else -1e9
+
+    stats = SearchStats()
+    if depth <= 0:
+        value = child.heuristic()
+    else:
+        value, _ = minimax_ab(child, maxdepth=depth, ab_prune=ab_prune, ordering=_worker_ordering, stats=stats,
+                              alpha=alpha, beta=beta)
+
+    with _worker_bound.get_lock():
+        if (maximize and value > _worker_bound.value) or (not maximize and value < _worker_bound.value):
+            _worker_bound.value = value
+    # Count the child itself one ply below the root, as a serial search would
+    stats.nodes += 1
+    stats.depth_nodes.insert(0, 0)
+    stats.depth_nodes[1] = 1
+    stats.iterations = list()
+    return value, stats
+
+
+def parallel_minimax_ab(node, maxdepth=1, ab_prune=True, workers=None, stats=None):
+    """
+    minimax search with the root moves spread across a process pool. Workers publish the best root value
+    found so far and each new root move is searched against it, so later moves are cut off as in a serial
+    search. The chosen move is the first best one in move order, the same as minimax_ab would pick, however
+    the workers are scheduled.
+    :param node: a Game object with legal_moves() and apply_move(), as for minimax_ab
+    :param maxdepth: cutoff depth for search
+    :param ab_prune: use alpha-beta pruning
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param stats: SearchStats to add the workers' counters to
+    :return: the value of the game state, the game state
+    """
+    start_time = time.time()
+    moves = MoveOrdering().order(node.legal_moves(), node)
+    if len(moves) <= 0:
+        return node.utility(), None
+    maximize = node.isMaxNode()
+
+    bound = multiprocessing.Value('d', -float('inf') if maximize else float('inf'))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parallel_worker, initargs=(bound,)) as pool:
+        futures = [pool.submit(_search_root_child, node.apply_move(m), maxdepth - 1, maximize, ab_prune)
+                   for m in moves]
+        results = [f.result() for f in futures]
+
+    value, move = None, None
+    for m, (v, child_stats) in zip(moves, results):
+        if stats is not None:
+            stats.merge(child_stats)
+        if move is None or (maximize and v > value) or (not maximize and v < value):
+            value, move = v, m
+    if stats is not None:
+        stats.iterations.append((maxdepth, sum(s.nodes for _, s in results), time.time() - start_time))
+    return value, node.apply_move(move)
+
+
+def main():
+    game = DragonQueenBB(None)
+    path = list()
+    path.append(game)
+
+    print("Dragon Queen Game:")
+    game.display()
+    queen_computer = input("Dragon Queen: (t for computer, f for human) ").lower() == 't'
+    wight_computer = input("Wights: (t for computer, f for human) ").lower() == 't'
+    print("\n")
+
+    tt = TranspositionTable()
+    ordering = MoveOrdering()
+    tablebase = Tablebase.load(TABLEBASE_FILE)
+    book = OpeningBook.load(BOOK_FILE)
+    # Depth the engine's searches reach in their time. Once pondering has got at least this deep, the reply is
+    # only searched to this depth, mostly from the table, instead of for the full time again.
+    target_depth = 0
+    ponder = None
+    start = dt.datetime.utcnow()
+    while True:
+        cur = path[-1]
+        cur.display()
+        if (cur.whoseTurn == 'W' and not wight_computer) or (cur.whoseTurn == 'D' and not queen_computer):
+            # Think on the human's time when the computer has the next move
+            ponder = None
+            if not cur.isTerminal() and (queen_computer or wight_computer):
+                ponder = Ponder(cur, tt, ordering, tablebase)
+            path.append(cur.get_move())
+            if ponder is not None:
+                ponder.stop()
+        elif cur.isTerminal():
+            break
+        else:
+            next_move = book.probe(cur) if book is not None else None
+            if next_move is None:
+                maxdepth = 50
+                if ponder is not None and 0 < target_depth <= ponder.depth():
+                    maxdepth = target_depth
+                stats = SearchStats()
+                _, next_move = iterative_deepening(cur, seconds=5.0, maxdepth=maxdepth, ab_prune=True, tt=tt,
+                                                   ordering=ordering, stats=stats, tablebase=tablebase)
+                if maxdepth == 50:
+                    target_depth = stats.completed_depth()
+            ponder = None
             if next_move is None:
                 break
             path.append(next_move)
@@ -1,38 +1,52 @@
-import DragonQueen5 as DragonQueen
+import jin_DragonQueen as DragonQueen
 import datetime as dt
-import copy
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sys import argv
 
 
 class Telemetry:
+    """
+    Statistics for one game. The search counts into self.stats as it goes (see DragonQueen.SearchStats), so
+    nothing is recomputed per node; the summary figures are filled in by stop().
+    """
     def __init__(self, description="Telemetry"):
         self.description = description
         self.start_time = dt.datetime.utcnow()
         self.stop_time = 0
         self.total_time = 0
-        self.path = None
+        self.record = None
+        self.stats = DragonQueen.SearchStats()
         self.nodes_visited = 0
         self.depth_reached = 0
         self.max_queue_size = 0
-        self.sum_queue_size = 0
         self.mean_queue_size = 0
+        self.cutoffs = 0
+        self.first_move_cutoff_rate = 0
+        self.tt_hits = 0
+        self.avg_time_per_search = 0
         self.plies_played = 0
         self.avg_time_per_ply = 0
         self.winner = None
 
-    def log(self, node):
-        self.nodes_visited += 1
-        self.depth_reached = max(self.depth_reached, node.countPlies)
-        num_successors = len(node.successors())
-        self.max_queue_size = max(self.max_queue_size, num_successors)
-        self.sum_queue_size += num_successors
-
-    def stop(self, path):
+    def stop(self, last_node, record=None):
+        """
+        :param last_node: final position of the game
+        :param record: DragonQueen.GameRecord of the game, kept instead of the positions played
+        """
         self.stop_time = dt.datetime.utcnow()
         self.total_time = (self.stop_time - self.start_time)
-        self.path = copy.deepcopy(path)
-        last_node = self.path[-1]
-        self.mean_queue_size = self.sum_queue_size / self.nodes_visited
+        self.record = record
+        self.nodes_visited = self.stats.nodes
+        # Depth counts plies below the position searched from; queue size is the number of moves searched at a node
+        self.depth_reached = self.stats.max_depth()
+        self.max_queue_size = self.stats.max_children
+        self.mean_queue_size = self.stats.branching_factor()
+        self.cutoffs = self.stats.cutoffs
+        self.first_move_cutoff_rate = self.stats.first_move_cutoff_rate()
+        self.tt_hits = self.stats.tt_hits
+        if len(self.stats.iterations) > 0:
+            self.avg_time_per_search = sum(t for _, _, t in self.stats.iterations) / len(self.stats.iterations)
         self.plies_played = last_node.countPlies
         self.avg_time_per_ply = self.total_time / self.plies_played
 
@@ -50,6 +64,11 @@ class Telemetry:
         s += "\n\tDepth Reached:     \t" + str(self.depth_reached)
         s += "\n\tMax. Queue Size:   \t" + str(self.max_queue_size)
         s += "\n\tMean Queue Size:   \t" + str(self.mean_queue_size)
+        s += "\n\tBeta Cutoffs:      \t" + str(self.cutoffs)
+        s += "\n\tFirst Move Cutoffs:\t" + str(self.first_move_cutoff_rate)
+        s += "\n\tTT Hits:           \t" + str(self.tt_hits)
+        s += "\n\tNodes Per Depth:   \t" + str(self.stats.depth_nodes[1:])
+        s += "\n\tAvg. Search Time:  \t" + str(self.avg_time_per_search)
         s += "\n\tTotal Time     :   \t" + str(self.total_time)
         s += "\n\tPlies Played:      \t" + str(self.plies_played)
         s += "\n\tAvg. Time Per Ply: \t" + str(self.avg_time_per_ply)
@@ -66,7 +85,11 @@ class Telemetry:
         s += str(self.total_time) + ","
         s += str(self.plies_played) + ","
         s += str(self.avg_time_per_ply) + ","
-        s += str(self.winner)
+        s += str(self.winner) + ","
+        s += str(self.cutoffs) + ","
+        s += str(self.first_move_cutoff_rate) + ","
+        s += str(self.tt_hits) + ","
+        s += str(self.avg_time_per_search)
         return s
 
     @staticmethod
@@ -80,10 +103,116 @@ class Telemetry:
         s += "Total Time" + ","
         s += "Plies Played" + ","
         s += "Avg. Time Per Ply" + ","
-        s += "Winner"
+        s += "Winner" + ","
+        s += "Beta Cutoffs" + ","
+        s += "First Move Cutoff Rate" + ","
+        s += "TT Hits" + ","
+        s += "Avg. Time Per Search"
         return s
 
 
+# Per-process state of the game workers, loaded once by _init_worker()
+_tablebase = None
+_book = None
+
+
+def _init_worker():
+    global _tablebase, _book
+    _tablebase = DragonQueen.Tablebase.load(DragonQueen.TABLEBASE_FILE)
+    _book = DragonQueen.OpeningBook.load(DragonQueen.BOOK_FILE)
+
+
+def play_game(run, depth, pruning):
+    """
+    Plays one game with both sides searching to the given depth. The search is deterministic, so a game
+    depends only on its configuration, not on which worker plays it or when.
+    :param run: run number
+    :param depth: search depth
+    :param pruning: use alpha-beta pruning
+    :return: run number, printable report, CSV row, GameRecord of the game
+    """
+    tel = Telemetry("Pruning = " + str(pruning) + " Depth = " + str(depth))
+    cur = DragonQueen.DragonQueen(None)
+    record = DragonQueen.GameRecord(None, run)
+    while True:
+        if cur.isTerminal():
+            break
+        else:
+            next_move = _book.probe(cur) if _book is not None else None
+            if next_move is None:
+                _, next_move = DragonQueen.minimax_ab(cur, maxdepth=depth, ab_prune=pruning, telemetry=tel,
+                                                      tablebase=_tablebase)
+            if next_move is None:
+                break
+            record.append_state(cur, next_move)
+            cur = next_move
+    tel.stop(cur, record)
+    report = "Run " + str(run) + ":\n" + str(tel)
+    return run, report, str(run) + "," + str(depth) + "," + str(pruning) + "," + tel.to_csv(), record
+
+
+def csv_header():
+    return "Run No.,Depth,Pruning," + Telemetry.csv_headers()
+
+
+def completed_runs(file_name):
+    """
+    Finds the games already recorded in an output file, so an interrupted sweep can carry on where it stopped.
+    A last row cut off part way through is removed from the file.
+    :param file_name: CSV file written by main()
+    :return: set of (run number, depth, pruning) configurations
+    """
+    if not os.path.exists(file_name):
+        return set()
+    with open(file_name) as f:
+        lines = f.readlines()
+    if len(lines) > 0 and not lines[-1].endswith("\n"):
+        lines = lines[:-1]
+        with open(file_name, "w") as f:
+            f.writelines(lines)
+    if len(lines) > 0 and lines[0] != csv_header() + "\n":
+        raise Exception(file_name + " is not an output file of this version of " + os.path.basename(__file__))
+    done = set()
+    for line in lines[1:]:
+        run, depth, pruning = line.split(",", 3)[:3]
+        done.add((int(run), int(depth), pruning == "True"))
+    return done
+
+
+def keep_games(file_name, runs):
+    """
+    Rewrites a game file with one record for each of the given runs. A game is recorded before its CSV row, so
+    after an interruption the file can hold games that are missing from the CSV and will be played again, or a
+    last record cut off part way through; those are dropped.
+    :param file_name: game file written by main()
+    :param runs: run numbers of the games in the CSV file
+    :return: None
+    """
+    if not os.path.exists(file_name):
+        return
+    records = dict()
+    for record in DragonQueen.read_game_records(file_name):
+        if record.game_id in runs and record.game_id not in records:
+            records[record.game_id] = record
+    games = DragonQueen.GameRecordWriter(file_name, append=False)
+    for run in sorted(records):
+        games.write(records[run])
+    games.close()
+
+
+def sort_runs(file_name):
+    """
+    Rewrites an output file with the rows in run order; they are written in the order the games finish
+    :param file_name: CSV file written by main()
+    :return: None
+    """
+    with open(file_name) as f:
+        lines = f.readlines()
+    rows = sorted(lines[1:], key=lambda line: int(line.split(",", 1)[0]))
+    with open(file_name, "w") as f:
+        f.writelines(lines[:1] + rows)
+
+
 def main():
     if len(argv) == 1:
         print("Dragon Queen Game Testing:")
@@ -100,6 +229,7 @@ def main():
         file_name = input("Enter output file name: ")
         if file_name[-4:] != ".csv":
             file_name = file_name + ".csv"
+        workers = None
 
     elif len(argv) == 4:
         min_depth = int(argv[1])
@@ -109,8 +239,9 @@ def main():
             exit(1)
         num_runs = int(argv[3])
         file_name = "output.csv"
+        workers = None
 
-    elif len(argv) == 5:
+    elif len(argv) in (5, 6):
         min_depth = int(argv[1])
         max_depth = int(argv[2])
         if max_depth < min_depth:
@@ -120,39 +251,52 @@ def main():
         file_name = argv[4]
         if file_name[-4:] != ".csv":
             file_name = file_name + ".csv"
+        workers = int(argv[5]) if len(argv) == 6 else None
 
     else:
-        print("Usage: python " + str(argv[0]) + " [min_depth max_depth num_runs [output_file_name]]")
+        print("Usage: python " + str(argv[0]) + " [min_depth max_depth num_runs [output_file_name [workers]]]")
         exit(1)
         return
 
+    configs = list()
     count_runs = 0
-    f = open(file_name, "w")
-    f.write("Run No.,Depth,Pruning," + Telemetry.csv_headers() + "\n")
     for pruning in [True, True]:
         for depth in range(min_depth, max_depth + 1):
             for i in range(0, num_runs):
                 count_runs += 1
-                tel = Telemetry("Pruning = " + str(pruning) + " Depth = " + str(depth))
-                game = DragonQueen.DragonQueen(None)
-                path = list()
-                path.append(game)
-                while True:
-                    cur = path[-1]
-                    if cur.isTerminal():
-                        break
-                    else:
-                        _, next_move = DragonQueen.minimax_ab(cur, maxdepth=depth, ab_prune=pruning, telemetry=tel)
-                                                              # ab_prune=pruning, telemetry=tel)
-                        if next_move is None:
-                            break
-                        path.append(next_move)
-                tel.stop(path)
-                print("Run " + str(count_runs) + ":")
-                print(tel)
-                f.write(str(count_runs) + "," + str(depth) + "," + str(pruning) + "," + tel.to_csv() + "\n")
-
-    f.close()
+                configs.append((count_runs, depth, pruning))
+
+    # Rows are appended as soon as each game finishes, so after an interruption the file already holds every
+    # finished game and a rerun with the same arguments only plays the rest. A file from a sweep with other
+    # arguments is left alone rather than mixed with this one.
+    done = completed_runs(file_name)
+    if not done <= set(configs):
+        print(file_name + " holds games of a sweep with different arguments. Aborting.")
+        exit(1)
+    if len(done) > 0:
+        print("Resuming: " + str(len(done)) + " of " + str(len(configs)) + " games already in " + file_name)
+    else:
+        with open(file_name, "w") as f:
+            f.write(csv_header() + "\n")
+
+    # Every game is also logged move by move, for replaying with DragonQueen.read_game_records()
+    games_file = file_name[:-4] + ".games"
+    if len(done) > 0:
+        keep_games(games_file, set(run for run, _, _ in done))
+    games = DragonQueen.GameRecordWriter(games_file, append=len(done) > 0)
+    with open(file_name, "a") as f:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(play_game, run, depth, pruning) for run, depth, pruning in configs
+                       if (run, depth, pruning) not in done]
+            for future in as_completed(futures):
+                run, report, row, record = future.result()
+                print(report)
+                games.write(record)
+                f.write(row + "\n")
+                f.flush()
+    games.close()
+
+    sort_runs(file_name)
 
 
 if __name__ == "__main__":